@@ -1,10 +1,35 @@
-from PIL import Image, ImageOps
+from PIL import Image, ImageOps, features
+import io
 import os
 import pandas as pd
 import numpy as np
 import json
+import hashlib
+import re
+import multiprocessing
+import shutil
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
 import string
+import time
+import argparse
+
+PUNCT_TABLE = str.maketrans('', '', string.punctuation)
+MANIFEST_NAME = '.prepare_images.json'
+MANIFEST_VERSION = 3
+# where prepare_images keeps the photos it was given, hidden so Jekyll doesn't publish them
+ORIGINALS_NAME = '.originals'
+# where an original goes when a new photo of the same name replaces it
+REPLACED_NAME = '.replaced'
+# name-320w.jpg / name-320w.webp srcset copies of name.jpg
+VARIANT_PATTERN = re.compile(r'^(.+)-\d+w\.(jpg|webp)$')
+MIN_QUALITY = 50
+ORIENTATION_TAG = 0x0112
+# what build_site last built from, kept in each site repo
+SITE_STATE_NAME = '.build_site.json'
+COHORT_COLUMNS = {'Tagline', 'Bio', 'Github', 'LinkedIn', 'Email'}
+TECHS_COLUMNS = {'Technology Name', 'Image Name', 'Info Link'}
+CLEAN_STRING_TABLE = str.maketrans({'“': '"', '”': '"', "’": "'", "—": "-"})
 
 
 def prepare_df(csv_path):
@@ -48,7 +73,7 @@ def make_mirrored_images(existing_img_list, image_dir):
 
 
 def remove_punct(s):
-    return s.translate(str.maketrans('', '', string.punctuation))
+    return s.translate(PUNCT_TABLE)
     
     
 def combine_names(names, sep = '_'):
@@ -56,44 +81,128 @@ def combine_names(names, sep = '_'):
     return sep.join(names)
 
 
+def _as_str(s):
+    '''
+    str() of every value, with missing values as 'nan', like str(row[col])
+    '''
+    return s.astype(object).where(s.notna(), 'nan').astype(str)
+
+
+def clean_strings(s):
+    '''
+    Column-wise clean_string: replaces curly quotes and em dashes, anything
+    that isn't a string becomes 'nan'
+    '''
+    if not (pd.api.types.is_object_dtype(s) or pd.api.types.is_string_dtype(s)):
+        return pd.Series('nan', index=s.index)
+    # .str gives NaN for values that aren't strings
+    return s.str.translate(CLEAN_STRING_TABLE).fillna('nan')
+
+
+def fix_urls(s):
+    '''
+    Column-wise fix_url
+    '''
+    urls = _as_str(s)
+    has_url = urls != 'nan'
+    needs_www = has_url & ~urls.str.contains('www', regex=False) & ~urls.str.contains('github', regex=False)
+    urls = urls.mask(needs_www, 'www.' + urls)
+    needs_https = has_url & ~urls.str.contains('https://', regex=False)
+    return urls.mask(needs_https, 'https://' + urls)
+
+
+def combine_name_columns(df, names, sep = '_'):
+    '''
+    Column-wise combine_names of the lowercased names columns
+    '''
+    parts = [df[name].str.lower().str.translate(PUNCT_TABLE) for name in names]
+    combined = parts[0]
+    for part in parts[1:]:
+        combined = combined + sep + part
+    return combined
+
+
+def check_files(sub_folder, file_names, path_to_repo):
+    '''
+    Column-wise check_file, with one listing of the folder instead of a stat per file
+    '''
+    folder = '{}/assets/{}'.format(path_to_repo, sub_folder)
+    existing = set(os.listdir(folder)) if os.path.isdir(folder) else set()
+    return file_names.where(file_names.isin(existing)).radd('../assets/{}/'.format(sub_folder)).fillna('nan')
+
+
+def srcset(variants, fmt = 'jpeg'):
+    return ', '.join('../assets/img/{} {}w'.format(name, width)
+                     for name, width, f in sorted(variants, key = lambda v: v[1]) if f == fmt) or 'nan'
+
+
+def image_columns(key, file_names, details):
+    '''
+    cohort.json fields with the size and srcset variants prepare_images made
+    of each image, e.g. proImgWidth, proImgSrcset
+    '''
+    fields = {key + 'Width': lambda d: d['pixels'][0],
+              key + 'Height': lambda d: d['pixels'][1],
+              key + 'Srcset': lambda d: srcset(d['variants']),
+              key + 'WebpSrcset': lambda d: srcset(d['variants'], 'webp')}
+    found = file_names.map(details)
+    return {field: found.map(lambda d: get(d) if isinstance(d, dict) else 'nan') for field, get in fields.items()}
+
+
 def make_cohort_dict(class_info, path_to_repo, names_to_use):
     '''
     function to make cohort.json.
     arg class_info: pandas DataFrame, df including minimally the columns:
         First, Last, Tagline, Bio, Github, LinkedIn, Capstone (link), Capstone (video), Email
+    Once prepare_images has run on assets/img, images also get their size and
+    srcset (e.g. proImgWidth, proImgHeight, proImgSrcset, proImgWebpSrcset).
     '''
-    cohort_json = {"cohort": []}
-    for ind, row in class_info.iterrows():
-        student_dict = {"id": ind,
-                        "firstName": row['First'],
-                        "lastName": row['Last'],
-                        "reelThemIn": clean_string(row['Tagline']),
-                        "bio": clean_string(row['Bio']),
-                        "github": fix_url(str(row['Github'])),
-                        "linkedIn": fix_url(str(row['LinkedIn'])),
-                        "portfolio": fix_url(str(row['Capstone (link)'])),
-                        "proImg": check_file("img", "{}1.jpg".format(combine_names([row[name].lower() for name in names_to_use])), path_to_repo),
-                        "funImg": check_file("img", "{}2.jpg".format(combine_names([row[name].lower() for name in names_to_use])), path_to_repo),
-                        "video": fix_url(str(row['Capstone (video)'])),
-                        "resume": check_file("resume", "{}.pdf".format(combine_names([row[name].lower() for name in names_to_use])), path_to_repo),
-                        "email": str(row['Email'])}
-        student_dict = {k:v for k, v in student_dict.items() if v != 'nan'}
-        cohort_json['cohort'].append(student_dict)
-    return cohort_json
+    file_stems = combine_name_columns(class_info, names_to_use)
+    pro_imgs = check_files("img", file_stems + "1.jpg", path_to_repo)
+    fun_imgs = check_files("img", file_stems + "2.jpg", path_to_repo)
+    details = image_details(path_to_repo + '/assets/img')
+    students = pd.DataFrame({"firstName": class_info['First'],
+                             "lastName": class_info['Last'],
+                             "reelThemIn": clean_strings(class_info['Tagline']),
+                             "bio": clean_strings(class_info['Bio']),
+                             "github": fix_urls(class_info['Github']),
+                             "linkedIn": fix_urls(class_info['LinkedIn']),
+                             "portfolio": fix_urls(class_info['Capstone (link)']),
+                             "proImg": pro_imgs,
+                             **image_columns("proImg", (file_stems + "1.jpg").where(pro_imgs != 'nan'), details),
+                             "funImg": fun_imgs,
+                             **image_columns("funImg", (file_stems + "2.jpg").where(fun_imgs != 'nan'), details),
+                             "video": fix_urls(class_info['Capstone (video)']),
+                             "resume": check_files("resume", file_stems + ".pdf", path_to_repo),
+                             "email": _as_str(class_info['Email'])},
+                            index=class_info.index)
+    records = students.astype(object).to_dict('records')
+    return {"cohort": [{"id": ind, **{k: v for k, v in student.items() if v != 'nan'}}
+                       for ind, student in zip(class_info.index.tolist(), records)]}
+
+
+def find_repo_root(path):
+    '''
+    the *.github.io repo folder path is in
+    '''
+    parts = os.path.normpath(path).split(os.sep)
+    for ind, part in enumerate(parts):
+        if part.endswith(".github.io"):
+            return os.sep.join(parts[:ind+1]) or os.sep
+    raise ValueError("{} is not in a .github.io repo".format(path))
 
 
 def make_cohort_json(csv_path, names_to_use = ['First']):
     if type(names_to_use) != list:
         names_to_use = [names_to_use]
-    split_path = csv_path.split("/")
-    repo_ind = [i for i, p in enumerate(split_path) if ".github.io" in p][0]
-    path_to_repo = "/".join(split_path[:repo_ind+1])
+    path_to_repo = find_repo_root(csv_path)
     df = prepare_df(csv_path)
     cohort_json = make_cohort_dict(df, path_to_repo, names_to_use)
-    outpath = "/".join(csv_path.split("/")[:-1])+"/cohort.json"
+    outpath = os.path.join(os.path.dirname(csv_path), "cohort.json")
     with open(outpath, "w") as outfile:
         json.dump(cohort_json, outfile)
     print("cohort.json created: {}".format(outpath))
+    return outpath
 
 
 def make_techs_json(csv_path):
@@ -104,10 +213,11 @@ def make_techs_json(csv_path):
                      "image": "../assets/tech_img/"+row["Image Name"],
                      "link": row["Info Link"]}
         techs_json['techs'].append(tech_dict)
-    outpath = "/".join(csv_path.split("/")[:-1])+"/techs.json"
+    outpath = os.path.join(os.path.dirname(csv_path), "techs.json")
     with open(outpath, "w") as outfile:
         json.dump(techs_json, outfile)
     print("techs.json created: {}".format(outpath))
+    return outpath
 
 
 def convert_to_jpg(img_path):
@@ -148,25 +258,539 @@ def find_image_height(img_path, aspect_ratio):
     else:
         print('new height for {}: '.format(im_name), new_height)
     
+def oriented_size(im):
+    '''
+    (width, height) as the image is shown, i.e. after its EXIF Orientation
+    (phone photos are often stored sideways with Orientation 6 or 8)
+    '''
+    return im.size[::-1] if im.getexif().get(ORIENTATION_TAG, 1) in (5, 6, 7, 8) else im.size
+
+
 def find_max_aspect_ratio(img_dir, img_list):
     pro_imgs = [im for im in img_list if '1' in im]
     max_ar = 0
     for img in pro_imgs:
-        im = Image.open(img_dir+'/'+img)
-        new_ar = im.width/im.height
+        with Image.open(img_dir+'/'+img) as im:
+            width, height = oriented_size(im)
+        new_ar = width/height
         if new_ar < 1:
             max_ar = max(max_ar, new_ar)
     print('max_ar: ', max_ar)
     return max_ar
 
-def prepare_images(img_dir, ignore_files = ['.DS_Store']):
-    existing_img_list = [im for im in os.listdir(img_dir) if im not in ignore_files]
-    max_ar = find_max_aspect_ratio(img_dir, existing_img_list)
-    for img_name in existing_img_list:
-        decrease_image_res(img_dir+'/'+img_name)
-        convert_to_jpg(img_dir+'/'+img_name)
-        if '1' in img_name:
-            find_image_height(img_dir+'/'+img_name, max_ar)
-    existing_img_list = [im for im in os.listdir(img_dir) if im not in ignore_files]
-    make_mirrored_images(existing_img_list, img_dir)
-    print("prepared all images in {}".format(img_dir))
+def jpg_name(img_name):
+    '''
+    name of the .jpg convert_to_jpg makes from img_name
+    '''
+    return '.'.join(img_name.split(".")[:-1]) + ".jpg"
+
+
+def plan_images(img_list):
+    '''
+    Works out, from the file names alone, what prepare_images makes of each
+    image: {jpg name: (source name, name of the mirrored copy to make or None)}.
+    When a .jpg and another image make the same jpg, the other image wins as
+    the .jpg was made from it.
+    '''
+    sources = {jpg_name(im): im for im in sorted(img_list, key = lambda im: im != jpg_name(im))}
+    jpgs = set(im for im in img_list if '.jpg' in im) | set(sources)
+    # people with a single image get a mirrored copy of their 1.jpg as their 2.jpg
+    people = Counter([im[:-5] for im in jpgs])
+    return {out: (src, out[:-5] + '2.jpg' if out.endswith('1.jpg') and people[out[:-5]] == 1 else None)
+            for out, src in sources.items()}
+
+
+def cropped_size(size, aspect_ratio):
+    '''
+    (width, height) at aspect_ratio, trimming whichever of width and height
+    is too long (the new height/width find_image_height suggests)
+    '''
+    width, height = size
+    new_height = round(width/aspect_ratio)
+    if new_height > height:
+        return round(height * aspect_ratio), height
+    return width, new_height
+
+
+def crop_box(size, aspect_ratio):
+    '''
+    centered (left, top, right, bottom) box at aspect_ratio
+    '''
+    width, height = cropped_size(size, aspect_ratio)
+    left, top = (size[0] - width) // 2, (size[1] - height) // 2
+    return left, top, left + width, top + height
+
+
+def output_size(size, aspect_ratio = None, max_width = None):
+    '''
+    (width, height) of the image prepare_image makes from one of this size
+    '''
+    width, height = cropped_size(size, aspect_ratio) if aspect_ratio else size
+    if not max_width or width <= max_width:
+        return width, height
+    # height from the aspect ratio itself so a rerun doesn't find it a pixel off
+    return max_width, round(max_width/aspect_ratio) if aspect_ratio else round(height * max_width / width)
+
+
+def variant_name(name, width, ext = 'jpg'):
+    return '{}-{}w.{}'.format(name[:-4], width, ext) if width else '{}.{}'.format(name[:-4], ext)
+
+
+def encode_jpeg(im, quality = 80, max_kb = None):
+    '''
+    progressive JPEG bytes, stepping the quality down (to no less than
+    MIN_QUALITY) until they fit in max_kb
+    '''
+    while True:
+        buf = io.BytesIO()
+        im.save(buf, "JPEG", quality = quality, optimize = True, progressive = True, dpi = (72, 72))
+        if not max_kb or buf.tell() <= max_kb * 1024 or quality - 5 < MIN_QUALITY:
+            return buf.getvalue()
+        quality -= 5
+
+
+def save_outputs(im, img_dir, name, quality = 80, max_kb = None, webp = False, widths = (), save_jpeg = True):
+    '''
+    Writes name and its srcset variants (narrower copies, and .webp copies
+    with webp). Returns what was written: {'pixels', 'variants'}, with
+    variants as [name, width, format] and the file names.
+    '''
+    files, variants = [], []
+    for width in [None] + sorted(w for w in widths if w < im.width):
+        resized = im if width is None else im.resize((width, round(im.height * width / im.width)), Image.LANCZOS)
+        out = variant_name(name, width)
+        if width is not None or save_jpeg:
+            with open(img_dir+'/'+out, 'wb') as f:
+                f.write(encode_jpeg(resized, quality, max_kb))
+            files.append(out)
+        variants.append([out, resized.width, 'jpeg'])
+        if webp:
+            out = variant_name(name, width, 'webp')
+            resized.save(img_dir+'/'+out, "WEBP", quality = quality, method = 6)
+            files.append(out)
+            variants.append([out, resized.width, 'webp'])
+    return {'pixels': list(im.size), 'variants': variants}, files
+
+
+def prepare_image(src_dir, img_dir, img_name, out_name, aspect_ratio = None, mirror_name = None,
+                  max_width = None, quality = 80, max_kb = None, webp = False, widths = ()):
+    '''
+    Does everything prepare_images does to one image in src_dir with a single
+    decode: crop to aspect_ratio, resize to max_width, 72dpi progressive JPEG
+    within max_kb, the mirrored copy and the srcset variants, all written to
+    img_dir. A .jpg that is already fine is copied rather than re-encoded,
+    so it keeps its quality.
+    '''
+    src = src_dir+'/'+img_name
+    with Image.open(src) as im:
+        shown = oriented_size(im)
+        size = output_size(shown, aspect_ratio, max_width)
+        needs_save = im.format != "JPEG" or img_name != out_name or size != im.size \
+            or im.getexif().get(ORIENTATION_TAG, 1) != 1 \
+            or im.info.get('dpi', (72, 72))[0] > 72 \
+            or bool(max_kb and os.path.getsize(src) > max_kb * 1024)
+        if not (needs_save or mirror_name or webp or any(w < size[0] for w in widths)):
+            shutil.copyfile(src, img_dir+'/'+out_name)
+            return {'source': img_name, 'image': out_name, 'saved': False, 'mirror': None,
+                    'pixels': list(im.size), 'images': {out_name: {'pixels': list(im.size), 'variants': [[out_name, im.width, 'jpeg']]}},
+                    'files': [out_name]}
+
+        # decode JPEGs at a reduced scale when the output is small enough
+        crop_width, crop_height = cropped_size(shown, aspect_ratio) if aspect_ratio else shown
+        draft_size = (-(-shown[0] * size[0] // crop_width), -(-shown[1] * size[1] // crop_height))
+        im.draft('RGB', draft_size if shown == im.size else draft_size[::-1])
+        im.load()
+        # turn the pixels upright before cropping, the saved JPEG has no Orientation tag
+        im = ImageOps.exif_transpose(im)
+        box = crop_box(im.size, aspect_ratio) if aspect_ratio else (0, 0) + im.size
+        im = im.convert('RGB') if im.mode not in ('RGB', 'L') else im
+        if size != im.size:
+            im = im.resize(size, Image.LANCZOS, box = box)
+
+    options = dict(quality = quality, max_kb = max_kb, webp = webp, widths = widths)
+    images, files = {}, []
+    images[out_name], written = save_outputs(im, img_dir, out_name, save_jpeg = needs_save, **options)
+    if not needs_save:
+        shutil.copyfile(src, img_dir+'/'+out_name)
+    files += [out_name] + [f for f in written if f != out_name]
+    if mirror_name:
+        images[mirror_name], written = save_outputs(im.transpose(Image.FLIP_LEFT_RIGHT), img_dir, mirror_name, **options)
+        files += written
+
+    return {'source': img_name, 'image': out_name, 'saved': needs_save, 'mirror': mirror_name,
+            'pixels': list(im.size), 'images': images, 'files': files}
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_stat(path):
+    st = os.stat(path)
+    return {'size': st.st_size, 'mtime': st.st_mtime_ns}
+
+
+def load_manifest(img_dir):
+    try:
+        with open(img_dir+'/'+MANIFEST_NAME) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    # older manifests don't record enough to skip anything
+    return manifest['images'] if manifest.get('version') == MANIFEST_VERSION else {}
+
+
+def save_manifest(img_dir, images):
+    path = img_dir+'/'+MANIFEST_NAME
+    with open(path + '.tmp', 'w') as f:
+        json.dump({'version': MANIFEST_VERSION, 'images': images}, f, indent = 1, sort_keys = True)
+    os.replace(path + '.tmp', path)
+
+
+def is_intact(folder, name, record):
+    '''
+    whether the file is still what the manifest recorded: same size and
+    mtime, or failing that the same content hash
+    '''
+    try:
+        stat = file_stat(folder+'/'+name)
+    except FileNotFoundError:
+        return False
+    if stat == {'size': record['size'], 'mtime': record['mtime']}:
+        return True
+    return 'hash' in record and file_hash(folder+'/'+name) == record['hash']
+
+
+def manifest_record(src_dir, img_dir, result, options):
+    '''
+    manifest entry for a source after prepare_image, with the state of the
+    files it made and the options they were made with
+    '''
+    src = src_dir+'/'+result['source']
+    return dict(file_stat(src), hash = file_hash(src), pixels = result['pixels'], mirror = result['mirror'],
+                image = result['image'], images = result['images'], options = options,
+                outputs = {out: file_stat(img_dir+'/'+out) for out in result['files']})
+
+
+def is_prepared(src_dir, img_dir, src, out, aspect_ratio, mirror, options, record):
+    '''
+    whether prepare_image would make the same outputs of src as last time
+    '''
+    return record is not None \
+        and record['image'] == out \
+        and record['mirror'] == mirror \
+        and record['options'] == options \
+        and output_size(record['pixels'], aspect_ratio, options['max_width']) == tuple(record['pixels']) \
+        and is_intact(src_dir, src, record) \
+        and all(is_intact(img_dir, name, stat) for name, stat in record['outputs'].items())
+
+
+def made_images(img_dir, manifest):
+    '''
+    files in img_dir that earlier runs made and are still as they were made
+    '''
+    return set(name for record in manifest.values() for name, stat in record['outputs'].items()
+               if is_intact(img_dir, name, stat))
+
+
+def list_originals(originals_dir, ignore_files = ()):
+    '''
+    photos in originals_dir, leaving out the replaced ones kept in REPLACED_NAME
+    '''
+    if not os.path.isdir(originals_dir):
+        return []
+    return [im for im in os.listdir(originals_dir)
+            if im not in ignore_files and not im.startswith('.') and os.path.isfile(originals_dir+'/'+im)]
+
+
+def is_variant(name, outputs):
+    '''
+    whether name is a srcset or .webp copy of one of the outputs
+    '''
+    match = VARIANT_PATTERN.match(name)
+    if match:
+        return match.group(1) + '.jpg' in outputs
+    return name.endswith('.webp') and name[:-5] + '.jpg' in outputs
+
+
+def keep_replaced(originals_dir, name):
+    '''
+    moves an original that a new photo of the same name is about to take
+    the place of into originals_dir/.replaced, numbered so none is lost
+    '''
+    replaced_dir = originals_dir + '/' + REPLACED_NAME
+    os.makedirs(replaced_dir, exist_ok = True)
+    stem, ext = os.path.splitext(name)
+    n = 1
+    while os.path.exists('{}/{}.{}{}'.format(replaced_dir, stem, n, ext)):
+        n += 1
+    os.replace(originals_dir+'/'+name, '{}/{}.{}{}'.format(replaced_dir, stem, n, ext))
+
+
+def collect_originals(img_dir, originals_dir, manifest, ignore_files = ()):
+    '''
+    Moves the photos in img_dir that prepare_images didn't make (new photos,
+    or replacements for ones it made) into originals_dir. Returns their names.
+
+    Mirrors and srcset/.webp copies are never taken for photos. Without a
+    manifest to tell them apart (lost, or from an older version), every
+    image the originals would make is taken for an earlier output and made
+    again from the originals. An original is never overwritten: one with the
+    same content is left as is, a different one is kept in .replaced.
+    '''
+    made = made_images(img_dir, manifest)
+    originals = list_originals(originals_dir, ignore_files)
+    plan = plan_images(originals)
+    mirrors = set(mirror for _, mirror in plan.values() if mirror) \
+        | set(record['mirror'] for record in manifest.values() if record['mirror'])
+    names = [im for im in sorted(os.listdir(img_dir))
+             if im not in ignore_files and not im.startswith('.') and os.path.isfile(img_dir+'/'+im)]
+    outputs = set(names) | set(plan) | mirrors | made
+    derived = made | mirrors | (set(plan) if originals and not manifest else set())
+
+    added = []
+    os.makedirs(originals_dir, exist_ok = True)
+    for im in names:
+        if im in derived or is_variant(im, outputs):
+            continue
+        if os.path.exists(originals_dir+'/'+im):
+            if file_hash(originals_dir+'/'+im) == file_hash(img_dir+'/'+im):
+                continue
+            keep_replaced(originals_dir, im)
+        os.replace(img_dir+'/'+im, originals_dir+'/'+im)
+        added.append(im)
+    return added
+
+
+def remove_stale_outputs(img_dir, old_manifest, new_manifest):
+    '''
+    Deletes files earlier runs made that the new manifest no longer has, e.g.
+    variants at widths no longer asked for or everything made of a photo
+    removed from the originals. Returns their names.
+    '''
+    kept = set(name for record in new_manifest.values() for name in record['outputs'])
+    removed = [name for record in old_manifest.values() for name, stat in record['outputs'].items()
+               if name not in kept and is_intact(img_dir, name, stat)]
+    for name in removed:
+        os.remove(img_dir+'/'+name)
+    return removed
+
+
+def image_details(img_dir):
+    '''
+    {jpg name: {'pixels', 'variants'}} for every image prepare_images made in
+    img_dir, from its manifest
+    '''
+    return {name: details for record in load_manifest(img_dir).values()
+            for name, details in record['images'].items()}
+
+
+def prepare_images(img_dir, ignore_files = ['.DS_Store'], max_workers = None, force = False,
+                   max_width = 800, quality = 80, max_kb = 200, webp = False, widths = ()):
+    '''
+    Gets every image in img_dir ready for the site: pro images (1.jpg)
+    cropped to the largest portrait aspect ratio among them, a mirrored
+    2.jpg for anyone with only a 1.jpg, and everything resized to at most
+    max_width pixels wide as 72dpi progressive .jpg files of about max_kb.
+    widths adds narrower srcset copies (name-320w.jpg), webp adds .webp
+    copies of each. The sizes and variants are recorded in the manifest for
+    make_cohort_json.
+    Each image is opened once, and images are processed on max_workers
+    processes (one per core by default).
+
+    Photos put in img_dir are moved to img_dir/.originals (ORIGINALS_NAME)
+    and the site images are made from there, so the originals are never
+    overwritten and changing an option or the aspect ratio starts from them
+    again. To take a photo off the site, delete it from .originals. A new
+    photo of the same name takes the place of an original, which is kept in
+    .originals/.replaced.
+
+    What was done is kept in a manifest in img_dir, and images whose
+    original and outputs haven't changed since are skipped. force=True
+    redoes them all, mirrors included.
+    '''
+    if webp and not features.check('webp'):
+        raise ValueError('This Pillow was built without WebP support.')
+    options = dict(max_width = max_width, quality = quality, max_kb = max_kb, webp = webp, widths = sorted(widths))
+
+    originals_dir = img_dir + '/' + ORIGINALS_NAME
+    manifest = load_manifest(img_dir)
+    added = collect_originals(img_dir, originals_dir, manifest, ignore_files)
+    existing_img_list = list_originals(originals_dir, ignore_files)
+    plan = plan_images(existing_img_list)
+    pro_imgs = {out: src for out, (src, _) in plan.items() if out.endswith('1.jpg')}
+    max_ar = find_max_aspect_ratio(originals_dir, list(pro_imgs.values()))
+
+    jobs = [(src, out, max_ar if out in pro_imgs and max_ar else None, mirror)
+            for out, (src, mirror) in plan.items()]
+    prepared = {} if force else {src: manifest[src] for src, out, ar, mirror in jobs
+                                 if is_prepared(originals_dir, img_dir, src, out, ar, mirror, options, manifest.get(src))}
+
+    todo = [job for job in jobs if job[0] not in prepared]
+    results = []
+    if todo:
+        # spawned, not forked: build_sites calls this from several threads at once
+        with ProcessPoolExecutor(max_workers = max_workers, mp_context = multiprocessing.get_context('spawn')) as pool:
+            futures = [pool.submit(prepare_image, originals_dir, img_dir, src, out, ar, mirror, **options)
+                       for src, out, ar, mirror in todo]
+            results = [f.result() for f in futures]
+
+    new_manifest = dict(prepared, **{r['source']: manifest_record(originals_dir, img_dir, r, options) for r in results})
+    removed = remove_stale_outputs(img_dir, manifest, new_manifest)
+    save_manifest(img_dir, new_manifest)
+
+    print("prepared all images in {} ({} new originals, {} written, {} mirrored, {} copied, {} skipped, {} removed)".format(
+        img_dir,
+        len(added),
+        sum(r['saved'] for r in results),
+        sum(r['mirror'] is not None for r in results),
+        sum(not r['saved'] for r in results),
+        len(prepared),
+        len(removed)))
+
+
+def csv_kind(csv_path):
+    '''
+    'cohort' or 'techs' from the CSV's header, None for any other CSV
+    '''
+    columns = set(pd.read_csv(csv_path, nrows = 0).columns)
+    if TECHS_COLUMNS <= columns:
+        return 'techs'
+    if COHORT_COLUMNS <= columns:
+        return 'cohort'
+    return None
+
+
+def find_sites(paths):
+    '''
+    {repo: {'cohort': [csv paths], 'techs': [csv paths]}} for every
+    *.github.io repo with cohort or techs CSVs among paths, which can be
+    CSVs or folders to search
+    '''
+    csv_paths = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames[:] = sorted(d for d in dirnames if not d.startswith('.') and d != 'node_modules')
+                csv_paths += [os.path.join(dirpath, f) for f in sorted(filenames) if f.endswith('.csv')]
+        else:
+            csv_paths.append(path)
+
+    sites = {}
+    for csv_path in csv_paths:
+        try:
+            repo = find_repo_root(csv_path)
+        except ValueError:
+            continue
+        kind = csv_kind(csv_path)
+        if kind:
+            sites.setdefault(repo, {'cohort': [], 'techs': []})[kind].append(csv_path)
+    return sites
+
+
+def inputs_fingerprint(files = (), dirs = (), **settings):
+    '''
+    hash of the files' contents, the dirs' listings and the settings
+    '''
+    h = hashlib.sha256(json.dumps(settings, sort_keys = True).encode())
+    for path in files:
+        h.update(path.encode())
+        h.update(file_hash(path).encode() if os.path.exists(path) else b'-')
+    for path in dirs:
+        h.update(path.encode())
+        h.update('/'.join(sorted(os.listdir(path))).encode() if os.path.isdir(path) else b'-')
+    return h.hexdigest()
+
+
+def build_site(repo, cohort_csvs = (), techs_csvs = (), names_to_use = ['First'], force = False,
+               image_workers = None, **image_options):
+    '''
+    Prepares assets/img and makes cohort.json and techs.json for one
+    *.github.io repo. JSON files whose inputs (CSV, image and resume folders,
+    image manifest) haven't changed since the last build are skipped, see
+    SITE_STATE_NAME. Returns seconds per step and what was skipped.
+    '''
+    img_dir, resume_dir = repo + '/assets/img', repo + '/assets/resume'
+    state_path = os.path.join(repo, SITE_STATE_NAME)
+    try:
+        with open(state_path) as f:
+            state = json.load(f)
+    except (OSError, ValueError):
+        state = {}
+
+    timings = {'site': repo, 'images': 0.0, 'cohort': 0.0, 'techs': 0.0, 'skipped': 0}
+    if os.path.isdir(img_dir):
+        start = time.perf_counter()
+        prepare_images(img_dir, max_workers = image_workers, force = force, **image_options)
+        timings['images'] = time.perf_counter() - start
+
+    steps = [('cohort', csv_path, lambda csv_path: make_cohort_json(csv_path, names_to_use),
+              dict(files = [csv_path, img_dir + '/' + MANIFEST_NAME], dirs = [img_dir, resume_dir], names = names_to_use))
+             for csv_path in cohort_csvs]
+    steps += [('techs', csv_path, make_techs_json, dict(files = [csv_path]))
+              for csv_path in techs_csvs]
+    for kind, csv_path, make_json, inputs in steps:
+        start = time.perf_counter()
+        out = os.path.relpath(os.path.join(os.path.dirname(csv_path), kind + '.json'), repo)
+        fingerprint = inputs_fingerprint(**inputs)
+        if not force and state.get(out) == fingerprint and os.path.exists(os.path.join(repo, out)):
+            timings['skipped'] += 1
+        else:
+            make_json(csv_path)
+            state[out] = fingerprint
+        timings[kind] += time.perf_counter() - start
+
+    with open(state_path, 'w') as f:
+        json.dump(state, f, indent = 1, sort_keys = True)
+    return timings
+
+
+def build_sites(paths, workers = 4, image_workers = None, **kwargs):
+    '''
+    build_site for every *.github.io repo find_sites finds in paths, workers
+    at a time, then prints how long each took
+    '''
+    sites = find_sites(paths)
+    if not sites:
+        print("no cohort or techs CSVs in a .github.io repo found in {}".format(', '.join(paths)))
+        return pd.DataFrame(columns = ['site', 'images', 'cohort', 'techs', 'skipped', 'total'])
+    if image_workers is None:
+        image_workers = max(1, (os.cpu_count() or 1) // min(workers, max(len(sites), 1)))
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers = workers) as pool:
+        futures = [pool.submit(build_site, repo, csvs['cohort'], csvs['techs'], image_workers = image_workers, **kwargs)
+                   for repo, csvs in sites.items()]
+        timings = pd.DataFrame([f.result() for f in futures], columns = ['site', 'images', 'cohort', 'techs', 'skipped'])
+
+    timings['total'] = timings[['images', 'cohort', 'techs']].sum(axis = 1)
+    print(timings.round(2).to_string(index = False))
+    print("built {} sites in {:.2f}s".format(len(timings), time.perf_counter() - start))
+    return timings
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description = "Make cohort.json, techs.json and images for class websites.")
+    parser.add_argument("paths", nargs = "+", help = "Cohort/techs CSVs, or folders to look for *.github.io repos in.")
+    parser.add_argument("--names", nargs = "+", default = ['First'],
+                        help = "Columns image and resume file names are made of. Default: First.")
+    parser.add_argument("--workers", type = int, default = 4, help = "Sites to build at once. Default: 4.")
+    parser.add_argument("--image-workers", type = int, help = "Processes per site for images. Default: shares the cores.")
+    parser.add_argument("--force", action = "store_true", help = "Rebuild everything, even if nothing changed.")
+    parser.add_argument("--max-width", type = int, default = 800, help = "Widest image, in pixels. Default: 800.")
+    parser.add_argument("--quality", type = int, default = 80, help = "JPEG quality to start from. Default: 80.")
+    parser.add_argument("--max-kb", type = int, default = 200, help = "Size to keep each image under. Default: 200.")
+    parser.add_argument("--widths", nargs = "*", type = int, default = [], help = "Widths of srcset copies to make.")
+    parser.add_argument("--webp", action = "store_true", help = "Make .webp copies of the images too.")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parse_args()
+    build_sites(args.paths, workers = args.workers, image_workers = args.image_workers, names_to_use = args.names,
+                force = args.force, max_width = args.max_width, quality = args.quality, max_kb = args.max_kb,
+                widths = args.widths, webp = args.webp)
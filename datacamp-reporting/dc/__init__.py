@@ -1,4 +1,5 @@
 
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum
 import getpass
 import logging
@@ -9,13 +10,33 @@ import pandas as pd
 from selenium.webdriver import Chrome
 from selenium.webdriver.chrome.options import Options
 
+from dc import session_cache
 from dc.selenium_utils import Secrets, DataCamp
+from dc.http_backend import DataCampHTTP
+from dc.snapshots import write_snapshot
+from dc.timing import latency_summary
 
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+class OutputFormat(Enum):
+    csv = 'csv'
+    parquet = 'parquet'
+
+    def __str__(self):
+        return self.value
+
+
+class Backend(Enum):
+    browser = 'browser'
+    http = 'http'
+
+    def __str__(self):
+        return self.value
+
+
 class Actions(Enum):
     reset_org = 'Reset Org'
     org_summary = 'Org Summary'
@@ -35,41 +56,111 @@ def _get_password():
     return getpass.getpass(prompt='DC password (hidden):', stream=None)
 
 
-def download_reports(org_name: str, *, out_dir: Path = None, show: bool = False):
-    secrets = Secrets(_get_email(), _get_password())
+def write_reports(reports: dict, out_dir: Path, fmt: OutputFormat = OutputFormat.csv):
+    """
+    csv overwrites <name>.csv in out_dir, parquet adds today's snapshot
+    under out_dir/<name>/ (see dc.snapshots).
+    """
+    for name, df in reports.items():
+        if fmt == OutputFormat.parquet:
+            write_snapshot(df, out_dir, name)
+        else:
+            df.to_csv(out_dir / f'{name}.csv', index=False)
+
+
+def _start_dc_driver(secrets: Secrets, org_name: str, show: bool, use_session_cache: bool = True,
+                     backend: Backend = Backend.browser):
+    if backend == Backend.http:
+        return DataCampHTTP(secrets=Secrets(secrets.email, secrets.password), org_name=org_name)
+
     options = Options()
     if not show:
         options.add_argument("--headless")
 
     driver = Chrome(options=options)
-    dc_driver = DataCamp(
+    return DataCamp(
         driver,
         secrets=Secrets(secrets.email, secrets.password),
-        org_name=org_name
+        org_name=org_name,
+        use_session_cache=use_session_cache
     )
 
+
+def _write_latency(dc_drivers, out_dir: Path):
+    timings_df = pd.concat([
+        dc_driver.timings.to_df().assign(worker=worker)
+        for worker, dc_driver in enumerate(dc_drivers)
+    ])
+    timings_df.to_csv(out_dir / 'latency.csv', index=False)
+    logger.info(f'Time spent per step (seconds):\n{latency_summary(timings_df).round(2)}')
+
+
+def download_reports(org_name: str, *, out_dir: Path = None, show: bool = False,
+                     fmt: OutputFormat = OutputFormat.csv, workers: int = 1,
+                     use_session_cache: bool = True, backend: Backend = Backend.browser):
+    email = _get_email()
+    sign_in_url = f'{DataCamp.BASE_URL}{DataCamp.SIGN_IN_PAGE}'
+    if backend == Backend.http:
+        # only ever uses the saved session
+        password = None
+    elif use_session_cache and session_cache.has_valid_session(email, sign_in_url):
+        logger.info('Using the saved DataCamp session, no need for a password.')
+        password = None
+    else:
+        password = _get_password()
+
+    secrets = Secrets(email, password)
+    dc_drivers = [_start_dc_driver(secrets, org_name, show, use_session_cache, backend)]
+    dc_driver = dc_drivers[0]
+
+    def scrape_assignments(worker: int, assignment_names) -> pd.DataFrame:
+        if worker == 0:
+            worker_driver = dc_driver
+        else:
+            # org_name is known by now, even if the first driver had to ask for it
+            worker_driver = _start_dc_driver(secrets, dc_driver.org_name, show, use_session_cache, backend)
+            dc_drivers.append(worker_driver)
+
+        logger.info(f'Worker {worker} getting {len(assignment_names)} assignment summaries.')
+        return worker_driver.get_assignment_summary_dfs(assignment_names)
+
     try:
 
         logger.info('Getting org summary.')
         org_summary_df = dc_driver.get_org_summary_df()
-
-        assignments = []
+        assignment_names = list(org_summary_df.assignment_name)
 
         logger.info('Getting assignment summary.')
-        for assignment in org_summary_df.assignment_name:
-            assignment_df = dc_driver.get_assignment_summary_df_by_name(assignment)
-            assignment_df['assignment'] = assignment
-            assignments.append(assignment_df)
-
-        assignments_df = pd.concat(assignments)
+        workers = max(1, min(workers, len(assignment_names)))
+        # contiguous chunks, so joining the workers' results keeps the org summary order
+        chunk_size = -(-len(assignment_names) // workers)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(scrape_assignments, worker, assignment_names[worker * chunk_size:(worker + 1) * chunk_size])
+                for worker in range(workers)
+            ]
+            assignments_df = pd.concat([future.result() for future in futures])
 
         logger.info('Getting student report summary.')
         student_report_df = dc_driver.get_student_assignment_report()
 
-        org_summary_df.to_csv(out_dir / 'org_summary.csv', index=False)
-        assignments_df.to_csv(out_dir / 'assignments.csv', index=False)
-        student_report_df.to_csv(out_dir / 'student_report.csv', index=False)
+        write_reports({
+            'org_summary': org_summary_df,
+            'assignments': assignments_df,
+            'student_report': student_report_df,
+        }, out_dir, fmt)
 
     finally:
         logger.info('Shuttin\' er dayown!')
-        dc_driver.quit()
+        for worker_driver in dc_drivers:
+            try:
+                worker_driver.quit()
+            except Exception as e:
+                logger.warning(f'Could not shut down a browser: {e}')
+
+        # timings outlive the drivers, and a failure here mustn't hide the scrape's own
+        if out_dir is not None:
+            try:
+                _write_latency(dc_drivers, out_dir)
+            except Exception as e:
+                logger.warning(f'Could not write the latency report: {e}')
@@ -0,0 +1,383 @@
+"""
+One table of how engaged each student is, joining their DataCamp progress
+with the commits in their Github repos.
+
+Both sides are kept in a small SQLite database that is brought up to date
+rather than rebuilt:
+ - commits are counted per repo and day straight from github_checker's
+   commits.sqlite, only reading the commits added since the last update
+ - a cohort's DataCamp reports are only read again when dc-reports has
+   written newer ones, and then only the newest snapshot
+
+Students are matched up through a roster csv (cohort, email, github) that
+instructors keep. Github Classroom names repos <assignment>-<handle>, so a
+repo belongs to the student whose handle ends its name, or who owns it.
+"""
+from datetime import datetime, timezone
+import logging
+import os
+from pathlib import Path
+import sqlite3
+from typing import Iterable, Optional
+
+import pandas as pd
+
+from dc.snapshots import PARTITION_COLUMN, read_snapshots, snapshot_dates
+
+logger = logging.getLogger(__name__)
+
+ENGAGEMENT_FILE = 'engagement.sqlite'
+ROSTER_COLUMNS = ['cohort', 'email', 'github']
+REPORTS = ['org_summary', 'assignments', 'student_report']
+STUDENT_COUNTS = ['courses_completed', 'exercises_completed', 'chapters_completed', 'xp']
+# same as github_checker's commit_store
+BOT_COMMITTERS = ['github-classroom[bot]']
+WINDOWS = (7, 28)
+TIME_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repo_days (
+    repo_name TEXT NOT NULL,
+    day TEXT NOT NULL,
+    commits INTEGER NOT NULL,
+    last_commit TEXT NOT NULL,
+    PRIMARY KEY (repo_name, day)
+);
+CREATE TABLE IF NOT EXISTS students (
+    cohort TEXT NOT NULL,
+    email TEXT NOT NULL,
+    name TEXT,
+    courses_completed INTEGER,
+    exercises_completed INTEGER,
+    chapters_completed INTEGER,
+    xp INTEGER,
+    PRIMARY KEY (cohort, email)
+);
+CREATE TABLE IF NOT EXISTS assignments (
+    cohort TEXT NOT NULL,
+    email TEXT NOT NULL,
+    assignment TEXT NOT NULL,
+    date_completed TEXT,
+    PRIMARY KEY (cohort, email, assignment)
+);
+CREATE TABLE IF NOT EXISTS due_dates (
+    cohort TEXT NOT NULL,
+    assignment TEXT NOT NULL,
+    due_date TEXT,
+    PRIMARY KEY (cohort, assignment)
+);
+CREATE TABLE IF NOT EXISTS marks (
+    source TEXT PRIMARY KEY,
+    mark TEXT NOT NULL
+);
+"""
+
+
+def _utc_text(s: pd.Series) -> pd.Series:
+    # ISO strings in UTC compare in time order inside SQLite
+    return pd.to_datetime(s, utc=True).dt.strftime(TIME_FORMAT)
+
+
+def _rows(df: pd.DataFrame) -> list:
+    return list(df.astype(object).where(df.notna(), None).itertuples(index=False, name=None))
+
+
+def normalize_handles(s: pd.Series) -> pd.Series:
+    """
+    Github handles as lower case logins, whether written as a login, @login or profile url.
+    """
+    return s.str.strip() \
+        .str.replace(r'^(https?://(www\.)?github\.com/|@)', '', regex=True) \
+        .str.rstrip('/') \
+        .str.lower()
+
+
+def read_roster(path: Path) -> pd.DataFrame:
+    """
+    The cohort, email and github handle of every student, normalized for
+    joining. An email listed twice in a cohort keeps its last row.
+    """
+    if not Path(path).exists():
+        return pd.DataFrame({col: pd.Series(dtype=object) for col in ROSTER_COLUMNS})
+
+    roster = pd.read_csv(path, dtype=str)
+    missing = set(ROSTER_COLUMNS) - set(roster.columns)
+    if missing:
+        raise ValueError(f'{path} is missing the columns {sorted(missing)}')
+
+    roster['cohort'] = roster['cohort'].str.strip()
+    roster['email'] = roster['email'].str.strip().str.lower()
+    roster['github'] = normalize_handles(roster['github'])
+    return roster.drop_duplicates(['cohort', 'email'], keep='last').reset_index(drop=True)
+
+
+def update_roster(path: Path, updates: pd.DataFrame) -> pd.DataFrame:
+    """
+    Adds or changes roster rows (matched on cohort and email) and writes the roster back.
+    """
+    updates = updates.copy()
+    updates['email'] = updates['email'].str.strip().str.lower()
+    updates['github'] = normalize_handles(updates['github'])
+
+    roster = pd.concat([read_roster(path), updates], ignore_index=True) \
+        .drop_duplicates(['cohort', 'email'], keep='last') \
+        .sort_values(['cohort', 'email'])
+
+    tmp_path = f'{path}.tmp'
+    roster.to_csv(tmp_path, index=False)
+    os.replace(tmp_path, path)
+    return roster.reset_index(drop=True)
+
+
+def repo_handles(repo_names: pd.Series, handles: Iterable[str]) -> pd.Series:
+    """
+    The handle each "org/repo" belongs to: the longest one ending the repo
+    name after a dash (Github Classroom's <assignment>-<handle>), else its
+    owner. NaN when neither is in handles.
+    """
+    handles = set(handles)
+    owner_name = repo_names.str.lower().str.split('/', n=1)
+    parts = owner_name.str[1].str.split('-')
+    n_parts = parts.str.len()
+
+    matched = pd.Series(float('nan'), index=repo_names.index, dtype=object)
+    for k in range(int(n_parts.max() if len(parts) else 0) - 1, 0, -1):
+        suffix = parts.str[-k:].str.join('-')
+        hit = matched.isna() & (n_parts > k) & suffix.isin(handles)
+        matched = matched.mask(hit, suffix)
+
+    owner = owner_name.str[0]
+    return matched.fillna(owner.where(owner.isin(handles)))
+
+
+class Engagement:
+    """
+    SQLite store of commit counts per repo and day and of each cohort's
+    latest DataCamp progress, which engagement reports are computed from.
+    """
+
+    def __init__(self, path: Path = ENGAGEMENT_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(str(path))
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def _mark(self, source: str) -> Optional[str]:
+        row = self.conn.execute('SELECT mark FROM marks WHERE source = ?', (source,)).fetchone()
+        return row[0] if row else None
+
+    def _set_mark(self, source: str, mark: str):
+        self.conn.execute('INSERT OR REPLACE INTO marks VALUES (?, ?)', (source, mark))
+
+    def update_commits(self, commits_db: Path) -> int:
+        """
+        Adds the commits stored in a github_checker commits.sqlite since the
+        last update to the per repo and day counts. Commits are only ever
+        added to that store, so its rowids tell the new ones apart.
+        Returns how many new commits were read.
+        """
+        source = f'commits:{Path(commits_db).resolve()}'
+        mark = int(self._mark(source) or 0)
+
+        self.conn.execute('ATTACH DATABASE ? AS github', (str(commits_db),))
+        try:
+            newest = self.conn.execute('SELECT MAX(rowid) FROM github.commits').fetchone()[0] or 0
+            with self.conn:
+                if newest < mark:
+                    logger.info(f'{commits_db} was started over, counting all of its commits again.')
+                    self.conn.execute(
+                        'DELETE FROM repo_days WHERE repo_name IN (SELECT DISTINCT repo_name FROM github.commits)'
+                    )
+                    mark = 0
+                self.conn.execute(
+                    f"""
+                    INSERT INTO repo_days
+                    SELECT repo_name, substr(date, 1, 10), COUNT(*), MAX(date)
+                    FROM github.commits
+                    WHERE rowid > ? AND rowid <= ? AND committer NOT IN ({','.join('?' * len(BOT_COMMITTERS))})
+                    GROUP BY repo_name, substr(date, 1, 10)
+                    ON CONFLICT (repo_name, day) DO UPDATE SET
+                        commits = commits + excluded.commits,
+                        last_commit = MAX(last_commit, excluded.last_commit)
+                    """,
+                    [mark, newest] + BOT_COMMITTERS,
+                )
+                self._set_mark(source, str(newest))
+        finally:
+            self.conn.execute('DETACH DATABASE github')
+
+        logger.info(f'Read {newest - mark} new commits from {commits_db}')
+        return newest - mark
+
+    def _read_reports(self, out_dir: Path):
+        """
+        The newest of each report dc-reports wrote to out_dir, with a mark
+        that changes whenever one of them does: the snapshot dates for
+        parquet output, the file times for csv.
+        """
+        out_dir = Path(out_dir)
+        newest = {report: snapshot_dates(out_dir, report) for report in REPORTS}
+        if all(newest.values()):
+            mark = ','.join(dates[-1].isoformat() for dates in newest.values())
+            return mark, lambda: {
+                report: read_snapshots(out_dir, report, start=dates[-1], end=dates[-1]).drop(columns=PARTITION_COLUMN)
+                for report, dates in newest.items()
+            }
+
+        paths = {report: out_dir / f'{report}.csv' for report in REPORTS}
+        missing = [str(path) for path in paths.values() if not path.exists()]
+        if missing:
+            raise FileNotFoundError(f'No DataCamp reports in {out_dir}, missing {missing}')
+        mark = ','.join(
+            datetime.fromtimestamp(path.stat().st_mtime, timezone.utc).isoformat() for path in paths.values()
+        )
+        return mark, lambda: {report: pd.read_csv(path) for report, path in paths.items()}
+
+    def update_datacamp(self, out_dir: Path, cohort: str) -> bool:
+        """
+        Replaces a cohort's DataCamp progress with the newest reports in
+        out_dir, unless those were already read.
+        Returns whether anything was read.
+        """
+        source = f'datacamp:{cohort}'
+        mark, read = self._read_reports(out_dir)
+        if self._mark(source) == mark:
+            logger.info(f'No new DataCamp reports for {cohort}')
+            return False
+        reports = read()
+
+        students = reports['student_report']
+        students = pd.DataFrame({
+            'cohort': cohort,
+            'email': students['email'].str.strip().str.lower(),
+            'name': students['name'],
+            **{col: students[col].astype('Int64') for col in STUDENT_COUNTS},
+        }).drop_duplicates(['cohort', 'email'], keep='last')
+
+        assignments = reports['assignments']
+        assignments = pd.DataFrame({
+            'cohort': cohort,
+            'email': assignments['email'].str.strip().str.lower(),
+            'assignment': assignments['assignment'].astype(str),
+            'date_completed': _utc_text(assignments['date_completed']),
+        }).drop_duplicates(['cohort', 'email', 'assignment'], keep='last')
+
+        org_summary = reports['org_summary']
+        due_dates = pd.DataFrame({
+            'cohort': cohort,
+            'assignment': org_summary['assignment_name'].astype(str),
+            'due_date': _utc_text(org_summary['due_date']),
+        }).drop_duplicates(['cohort', 'assignment'], keep='last')
+
+        with self.conn:
+            for table, df in [('students', students), ('assignments', assignments), ('due_dates', due_dates)]:
+                self.conn.execute(f'DELETE FROM {table} WHERE cohort = ?', (cohort,))
+                self.conn.executemany(
+                    f"INSERT INTO {table} VALUES ({','.join('?' * len(df.columns))})", _rows(df)
+                )
+            self._set_mark(source, mark)
+
+        logger.info(f'Read DataCamp progress of {len(students)} students in {cohort}')
+        return True
+
+    def assignment_summary(self, as_of: pd.Timestamp, windows=WINDOWS) -> pd.DataFrame:
+        """
+        Per cohort and email, how many assignments were completed, late and
+        missed, and how many due in each of the last N days were late or missed.
+        Late is completed after the due date, missed is not completed by it.
+        """
+        params = {'as_of': as_of.strftime(TIME_FORMAT)}
+        columns = [
+            'SUM(a.date_completed IS NOT NULL) AS assignments_completed',
+            'SUM(a.date_completed > d.due_date) AS assignments_late',
+            'SUM(a.date_completed IS NULL AND d.due_date <= :as_of) AS assignments_missed',
+        ]
+        for days in windows:
+            params[f'since_{days}'] = (as_of - pd.Timedelta(days=days)).strftime(TIME_FORMAT)
+            in_window = f'd.due_date > :since_{days} AND d.due_date <= :as_of'
+            columns += [
+                f'SUM({in_window} AND a.date_completed > d.due_date) AS late_{days}d',
+                f'SUM({in_window} AND a.date_completed IS NULL) AS missed_{days}d',
+            ]
+
+        df = pd.read_sql_query(
+            f"""
+            SELECT a.cohort, a.email, {', '.join(columns)}
+            FROM assignments a LEFT JOIN due_dates d USING (cohort, assignment)
+            GROUP BY a.cohort, a.email
+            """,
+            self.conn,
+            params=params,
+        )
+        counts = df.columns[2:]
+        df[counts] = df[counts].fillna(0).astype('Int64')
+        return df
+
+    def commit_summary(self, handles: Iterable[str], as_of: pd.Timestamp, windows=WINDOWS) -> pd.DataFrame:
+        """
+        Per github handle, commits in total and in each of the last N days, and the latest commit.
+        """
+        params = {'as_of': as_of.strftime('%Y-%m-%d')}
+        columns = ['SUM(commits) AS commits_total']
+        for days in windows:
+            params[f'since_{days}'] = (as_of - pd.Timedelta(days=days)).strftime('%Y-%m-%d')
+            columns.append(f'SUM(CASE WHEN day > :since_{days} THEN commits ELSE 0 END) AS commits_{days}d')
+
+        # one row per repo, so only distinct repo names are matched to handles
+        repos = pd.read_sql_query(
+            f"""
+            SELECT repo_name, {', '.join(columns)}, MAX(last_commit) AS last_commit
+            FROM repo_days WHERE day <= :as_of
+            GROUP BY repo_name
+            """,
+            self.conn,
+            params=params,
+        )
+        github = repo_handles(repos['repo_name'], handles)
+        df = repos.drop(columns='repo_name').groupby(github.rename('github')).agg(
+            {**{col: 'sum' for col in repos.columns[1:-1]}, 'last_commit': 'max'}
+        )
+        df['last_commit'] = pd.to_datetime(df['last_commit'], utc=True)
+        return df.reset_index()
+
+    def report(self, roster: pd.DataFrame, as_of: pd.Timestamp = None, windows=WINDOWS) -> pd.DataFrame:
+        """
+        One row per student in the roster or in the DataCamp reports, with
+        their DataCamp progress, assignment counts and commit activity as of
+        a time (now by default). Students missing from the roster have no
+        github handle, so no commits.
+        """
+        as_of = pd.Timestamp.now(tz='UTC') if as_of is None else pd.Timestamp(as_of)
+        as_of = as_of.tz_localize('UTC') if as_of.tzinfo is None else as_of.tz_convert('UTC')
+
+        students = pd.read_sql_query('SELECT * FROM students', self.conn)
+        students[STUDENT_COUNTS] = students[STUDENT_COUNTS].astype('Int64')
+
+        df = roster[ROSTER_COLUMNS] \
+            .merge(students, on=['cohort', 'email'], how='outer') \
+            .merge(self.assignment_summary(as_of, windows), on=['cohort', 'email'], how='left')
+
+        commits = self.commit_summary(roster['github'].dropna(), as_of, windows)
+        df = df.merge(commits, on='github', how='left')
+        has_github = df['github'].notna()
+        for col in commits.columns.drop(['github', 'last_commit']):
+            df[col] = df[col].where(~has_github, df[col].fillna(0)).astype('Int64')
+        # commits are counted by day, so the latest one may be later on the day of as_of
+        df['days_since_last_commit'] = (as_of.normalize() - df['last_commit'].dt.normalize()).dt.days.astype('Int64')
+
+        return df.sort_values(['cohort', 'email']).reset_index(drop=True)
+
+    def unmatched_repos(self, roster: pd.DataFrame) -> pd.Series:
+        """
+        Repos with commits that no roster handle accounts for, to find who is missing from the roster.
+        """
+        repos = pd.read_sql_query('SELECT DISTINCT repo_name FROM repo_days ORDER BY repo_name', self.conn)['repo_name']
+        return repos[repo_handles(repos, roster['github'].dropna()).isna()].reset_index(drop=True)
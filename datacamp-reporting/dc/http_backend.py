@@ -0,0 +1,180 @@
+"""
+Browser-free DataCamp backend.
+
+Fetches the same reporting pages as DataCamp with a requests.Session carrying
+the cookies of a saved browser login (see dc.session_cache), and reads the
+tables straight from the HTML. No Chrome process, no rendering.
+
+The DataFrames it returns come from the same dc.tables clean up as the
+Selenium backend, so reports are identical whichever one is used.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import logging
+from urllib.parse import urljoin
+
+import lxml.html
+import pandas as pd
+import requests
+
+from dc import session_cache, tables
+from dc.selenium_utils import DataCamp, NoSuchAssignmentException, Secrets
+from dc.timing import Timings
+
+logger = logging.getLogger(__name__)
+logger.setLevel(logging.INFO)
+
+TABLE_COMPONENT_XPATH = '//*[contains(concat(" ", normalize-space(@class), " "), " table-component ")]'
+
+
+class NoSavedSessionException(Exception):
+    pass
+
+
+class DataCampHTTP:
+    """
+    Same public methods as DataCamp, backed by plain HTTP requests.
+    Needs a saved session, so log in with the browser backend at least once.
+    """
+
+    BASE_URL = DataCamp.BASE_URL
+    TIMEOUT = DataCamp.TIMEOUT
+
+    def __init__(self, secrets: Secrets, org_name=None, session: requests.Session = None):
+        if org_name is None:
+            raise ValueError('The HTTP backend needs an org name.')
+
+        self.org_name = org_name
+        self.timings = Timings()
+
+        self._secrets = secrets
+        self._session = session or requests.Session()
+        self._logged_in = False
+        self._assignment_urls = None
+
+    @property
+    def logged_in(self):
+        return self._logged_in
+
+    def login(self):
+        logger.info('Loading saved session.')
+        with self.timings.step('login'):
+            cookies = session_cache.load_cookies(self._secrets.email)
+            sign_in_url = f'{self.BASE_URL}{DataCamp.SIGN_IN_PAGE}'
+            if not cookies or not session_cache.cookies_are_valid(cookies, sign_in_url):
+                raise NoSavedSessionException(
+                    'No live saved session. Run once with the browser backend to log in.'
+                )
+
+            for c in cookies:
+                self._session.cookies.set(c['name'], c['value'], domain=c.get('domain'), path=c.get('path', '/'))
+
+        self._logged_in = True
+        logger.info('Successfully logged in.')
+
+    def get_org_summary_df(self) -> pd.DataFrame:
+        logger.info('Getting assignments summary dataframe.')
+        page = self._get_assignments_page()
+        return tables.clean_org_summary_df(self._table_component_df(page))
+
+    def get_assignment_summary_df_by_name(self, assignment_name, parse_dates=True):
+        url = self._assignment_url(assignment_name)
+        logger.info(f'Assignment {assignment_name} found on summary page, getting summary dataframe.')
+
+        page = self._get(url, assignment_name)
+        return tables.clean_assignment_summary_df(self._table_component_df(page), parse_dates)
+
+    def get_assignment_summary_dfs(self, assignment_names=None, prefetch=True) -> pd.DataFrame:
+        """
+        Summaries of many assignments (all of them by default) as one
+        DataFrame with an `assignment` column. With prefetch, the next detail
+        page is downloaded on a background thread while the current one is
+        parsed, so no more than two pages are held at once.
+        """
+        if self._assignment_urls is None:
+            self._get_assignments_page()
+        if assignment_names is None:
+            assignment_names = list(self._assignment_urls)
+
+        urls = [self._assignment_url(assignment_name) for assignment_name in assignment_names]
+        dfs = []
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            next_page = pool.submit(self._get, urls[0], assignment_names[0]) if prefetch and urls else None
+            for ind, (assignment_name, url) in enumerate(zip(assignment_names, urls)):
+                if prefetch:
+                    page = next_page.result()
+                    if ind + 1 < len(urls):
+                        next_page = pool.submit(self._get, urls[ind + 1], assignment_names[ind + 1])
+                else:
+                    page = self._get(url, assignment_name)
+
+                df = tables.clean_assignment_summary_df(self._table_component_df(page), parse_dates=False)
+                df['assignment'] = assignment_name
+                dfs.append(df)
+                del page
+
+        return tables.concat_assignment_dfs(dfs)
+
+    def get_student_assignment_report(self):
+        page = self._get(f'{self.BASE_URL}/enterprise/{self.org_name}/reporting')
+        return tables.clean_student_report_df(self._table_component_df(page))
+
+    def quit(self):
+        self._session.close()
+        self._logged_in = False
+
+    def _get(self, url, detail=None):
+        if not self._logged_in:
+            self.login()
+
+        logger.info(f'Going to url: {url}')
+        with self.timings.step('navigation', detail or url[len(self.BASE_URL):]):
+            res = self._session.get(url, timeout=self.TIMEOUT)
+            res.raise_for_status()
+
+        if DataCamp.SIGN_IN_PAGE in res.url:
+            self._logged_in = False
+            raise NoSavedSessionException('Saved session expired. Log in with the browser backend again.')
+
+        with self.timings.step('parse', 'html'):
+            return lxml.html.fromstring(res.content, base_url=res.url)
+
+    def _get_assignments_page(self):
+        page = self._get(f'{self.BASE_URL}/enterprise/{self.org_name}/assignments')
+        self._assignment_urls = self._find_assignment_urls(page)
+        return page
+
+    def _assignment_url(self, assignment_name):
+        if self._assignment_urls is None:
+            self._get_assignments_page()
+
+        try:
+            return self._assignment_urls[assignment_name]
+        except KeyError:
+            raise NoSuchAssignmentException(f'Assignment {assignment_name} not found.')
+
+    def _find_assignment_urls(self, page) -> dict:
+        """
+        Maps each assignment name in the summary table to its detail page,
+        taken from the link (or data-href) on the assignment's row.
+        """
+        urls = {}
+        for row in page.xpath(f'{TABLE_COMPONENT_XPATH}//table//tbody/tr'):
+            cells = row.xpath('./td')
+            if not cells:
+                continue
+
+            hrefs = row.xpath('.//a/@href') or row.xpath('./@data-href')
+            if hrefs:
+                urls[cells[0].text_content().strip()] = urljoin(page.base_url, hrefs[0])
+
+        return urls
+
+    def _table_component_df(self, page) -> pd.DataFrame:
+        logger.info('Getting table component.')
+        components = page.xpath(TABLE_COMPONENT_XPATH)
+        if not components:
+            raise ValueError('No table on the page. It may only be rendered by javascript, use the browser backend.')
+
+        with self.timings.step('parse', 'table'):
+            html = lxml.html.tostring(components[0], encoding='unicode')
+            return tables.first_table_df(html)
@@ -5,7 +5,6 @@ from collections import namedtuple
 import logging
 import re
 
-import numpy as np
 import pandas as pd
 
 from selenium.webdriver import Chrome
@@ -14,6 +13,9 @@ from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from selenium.common.exceptions import NoSuchElementException
 
+from dc import session_cache, tables
+from dc.timing import Timings
+
 logger = logging.getLogger(__name__)
 logger.setLevel(logging.INFO)
 
@@ -43,16 +45,42 @@ def must_have_org(f):
     return inner
 
 
+_ASSIGNMENT_URLS_JS = """
+return Array.from(document.querySelectorAll('.table-component table tbody tr')).map(function (row) {
+    var cell = row.querySelector('td');
+    var link = row.querySelector('a[href]');
+    var href = link ? link.href : (row.dataset.href ? new URL(row.dataset.href, location.href).href : null);
+    return [cell ? cell.textContent.trim() : null, href];
+});
+"""
+
+_PREFETCH_JS = """
+var link = document.createElement('link');
+link.rel = 'prefetch';
+link.href = arguments[0];
+document.head.appendChild(link);
+"""
+
+
+def _document_ready(driver):
+    return driver.execute_script('return document.readyState') == 'complete'
+
+
 class DataCamp:
 
     BASE_URL = 'https://www.datacamp.com'
+    SIGN_IN_PAGE = '/users/sign_in'
+    # upper bound on every wait, most conditions are met well before this
+    TIMEOUT = 10
 
-    def __init__(self, driver: Chrome, secrets: Secrets, org_name=None):
+    def __init__(self, driver: Chrome, secrets: Secrets, org_name=None, use_session_cache=True):
         self.org_name = org_name
+        self.timings = Timings()
 
         self._driver = driver
         self._secrets = secrets
         self._logged_in = False
+        self._use_session_cache = use_session_cache
 
     @property
     def logged_in(self):
@@ -64,7 +92,7 @@ class DataCamp:
     def get_org_name(self):
         self.goto('/enterprise')
 
-        organizations = WebDriverWait(self._driver, 10).until(
+        organizations = self._wait().until(
             EC.presence_of_element_located((By.CLASS_NAME, "organizations"))
         ).find_elements_by_xpath('//li[contains(@class, "organization")]//a')
 
@@ -96,75 +124,88 @@ class DataCamp:
         href, title = select_org_from_list(org_attributes)
         return href
 
-    def goto(self, page, wait=2):
+    def goto(self, page):
         url = f'{self.BASE_URL}{page}'
         logger.info(f'Going to url: {url}')
 
-        self._driver.get(url)
-        self._driver.implicitly_wait(wait)
+        with self.timings.step('navigation', page):
+            self._driver.get(url)
+            self._wait().until(_document_ready)
 
     def login(self):
         logger.info('Logging in.')
-        self._driver.get('https://www.datacamp.com/users/sign_in')
+        with self.timings.step('login'):
+            if not (self._use_session_cache and self._restore_session()):
+                self._login()
+                if self._use_session_cache:
+                    session_cache.save_cookies(self._secrets.email, self._driver.get_cookies())
+
+        self._logged_in = True
+        logger.info('Successfully logged in.')
+
+    def _restore_session(self) -> bool:
+        cookies = session_cache.load_cookies(self._secrets.email)
+        if not cookies:
+            return False
 
-        form = WebDriverWait(self._driver, 10).until(
+        if not session_cache.cookies_are_valid(cookies, f'{self.BASE_URL}{self.SIGN_IN_PAGE}'):
+            logger.info('Saved session has expired.')
+            session_cache.clear_cookies(self._secrets.email)
+            return False
+
+        # cookies can only be added for the domain the browser is on
+        self._driver.get(f'{self.BASE_URL}/robots.txt')
+        for cookie in cookies:
+            self._driver.add_cookie(cookie)
+
+        logger.info('Restored saved session.')
+        return True
+
+    def _login(self):
+        if self._secrets.password is None:
+            raise ValueError('No password given and no saved session to use.')
+
+        self._driver.get(f'{self.BASE_URL}{self.SIGN_IN_PAGE}')
+
+        form = self._wait().until(
             EC.presence_of_element_located((By.ID, "new_user"))
         )
 
-        email_input = WebDriverWait(form, 10).until(
+        email_input = self._wait(form).until(
             EC.presence_of_element_located((By.ID, "user_email"))
         )
         email_input.send_keys(self._secrets.email)
-        self._driver.implicitly_wait(2)
 
-        next_button = WebDriverWait(form, 10).until(
+        next_button = self._wait(form).until(
             EC.element_to_be_clickable((By.TAG_NAME, "button"))
         )
         next_button.click()
-        self._driver.implicitly_wait(2)
 
-        password_input = WebDriverWait(form, 10).until(
-            EC.presence_of_element_located((By.ID, "user_password"))
+        password_input = self._wait(form).until(
+            EC.visibility_of_element_located((By.ID, "user_password"))
         )
         password_input.send_keys(self._secrets.password)
-        self._driver.implicitly_wait(2)
 
-        signin_button = WebDriverWait(form, 10).until(
+        signin_button = self._wait(form).until(
             EC.element_to_be_clickable((By.CSS_SELECTOR, "input[type='submit']"))
         )
         signin_button.click()
 
-        WebDriverWait(self._driver, 10).until(
+        self._wait().until(
             EC.presence_of_element_located((By.CLASS_NAME, "groups"))
         )
 
-        self._logged_in = True
-        logger.info('Successfully logged in.')
-
     @must_be_logged_in
     @must_have_org
     def get_org_summary_df(self) -> pd.DataFrame:
         logger.info('Getting assignments summary dataframe.')
         self._goto_assignments()
 
-        df = self._get_table_component_df()
-
-        df.columns = ['assignment_name', 'assigned_to', 'assigned_date',
-                      'due_date', 'type', 'num_completed', 'num_late', 'num_missed', '?']
-        df.loc[:, 'assigned_date'] = pd.to_datetime(df['assigned_date'], format='%b %d, %Y')
-        df.loc[:, 'due_date'] = df.loc[:, 'due_date'].str.replace(r'\s\w+$', '')
-        df.loc[:, 'due_date'] = pd.to_datetime(df['due_date'], format='%b %d, %Y, %H:%M')
-        df.loc[:, 'assignment_name_len'] = df['assignment_name'].apply(lambda x: len(x))
-
-        df = df[
-            ['assignment_name', 'assigned_date', 'due_date', 'num_completed', 'num_late', 'num_missed']] \
-            .sort_values('due_date', ascending=False)
-
-        return df
+        return tables.clean_org_summary_df(self._get_table_component_df())
 
     @must_be_logged_in
     @must_have_org
-    def get_assignment_summary_df_by_name(self, assignment_name):
+    def get_assignment_summary_df_by_name(self, assignment_name, parse_dates=True):
 
         self._goto_assignments()
 
@@ -176,27 +217,51 @@ class DataCamp:
 
         else:
             logger.info(f'Assignment {assignment_name} found on summary page, getting summary dataframe.')
-            assignment.click()
-            self._driver.implicitly_wait(2)
 
             # title
             xpath = f'//*[@id="content"]//h2[contains(text(), "{assignment_name}")]'
             logger.info(f'Waiting for {xpath}')
-            WebDriverWait(self._driver, 10).until(
-                EC.presence_of_element_located((By.XPATH, xpath))
-            )
+            with self.timings.step('navigation', assignment_name):
+                assignment.click()
+                self._wait().until(
+                    EC.presence_of_element_located((By.XPATH, xpath))
+                )
+
+            return tables.clean_assignment_summary_df(self._get_table_component_df(), parse_dates)
+
+    @must_be_logged_in
+    @must_have_org
+    def get_assignment_summary_dfs(self, assignment_names=None, prefetch=True) -> pd.DataFrame:
+        """
+        Summaries of many assignments (all of them by default) as one
+        DataFrame with an `assignment` column. The assignments page is read
+        once for each row's detail link, then every detail page is opened
+        directly. With prefetch, the browser is told to fetch the next detail
+        page while the current one is parsed.
+        """
+        self._goto_assignments()
+        urls = self._find_assignment_urls()
+        if assignment_names is None:
+            assignment_names = list(urls)
 
-            df = self._get_table_component_df()
+        dfs = []
+        for ind, assignment_name in enumerate(assignment_names):
+            if assignment_name in urls:
+                self._goto_assignment(assignment_name, urls[assignment_name])
 
-            df.columns = ['email', 'student_name', 'status', 'date_completed']
+                next_name = assignment_names[ind + 1] if ind + 1 < len(assignment_names) else None
+                if prefetch and next_name in urls:
+                    self._prefetch(urls[next_name])
 
-            df.loc[:, 'email'] = df['email'].str.replace(r'[A-Z]\s', '')
-            df.loc[:, 'date_completed'] = df['date_completed'].replace('Not yet completed', np.NaN)
-            # removing tz info
-            df.loc[:, 'date_completed'] = df['date_completed'].str.replace(r'\s[A-Z]+$', '')
-            df.loc[:, 'date_completed'] = pd.to_datetime(df['date_completed'], format='%b %d, %Y, %H:%M')
+                df = tables.clean_assignment_summary_df(self._get_table_component_df(), parse_dates=False)
+            else:
+                # rows without a link can only be reached by clicking them
+                df = self.get_assignment_summary_df_by_name(assignment_name, parse_dates=False)
+
+            df['assignment'] = assignment_name
+            dfs.append(df)
 
-            return df
+        return tables.concat_assignment_dfs(dfs)
 
     @must_be_logged_in
     @must_have_org
@@ -204,38 +269,61 @@ class DataCamp:
         self.goto(f'/enterprise/{self.org_name}/reporting')
 
         # title
-        WebDriverWait(self._driver, 10).until(
+        self._wait().until(
             EC.presence_of_element_located((By.XPATH, '//h2[contains(text(), "Reporting")]'))
         )
 
-        df = self._get_table_component_df()
-        df.columns = ['email', 'name', 'courses_completed', 'exercises_completed', 'chapters_completed', 'xp']
-
-        return df
+        return tables.clean_student_report_df(self._get_table_component_df())
 
     def quit(self):
-        self._driver.close()
+        self._driver.quit()
         self._logged_in = False
 
     def _get_table_component_df(self):
         logger.info('Getting table component.')
-        table_parent = WebDriverWait(self._driver, 10).until(
-            EC.presence_of_element_located((By.CLASS_NAME, "table-component"))
+        with self.timings.step('table render'):
+            # the component wrapper is on the page before its table is
+            self._wait().until(
+                EC.presence_of_element_located((By.CSS_SELECTOR, ".table-component table"))
+            )
+            table_parent = self._driver.find_element_by_class_name("table-component")
+            html = table_parent.get_attribute('innerHTML')
+
+        with self.timings.step('parse'):
+            return tables.first_table_df(html)
+
+    def _find_assignment_urls(self) -> dict:
+        """
+        Maps each assignment name on the assignments page to its detail page,
+        taken from the link (or data-href) on the assignment's row.
+        """
+        self._wait().until(
+            EC.presence_of_element_located((By.CSS_SELECTOR, ".table-component table"))
         )
+        rows = self._driver.execute_script(_ASSIGNMENT_URLS_JS)
+        return {name: url for name, url in rows if name and url}
 
-        dfs = pd.read_html(table_parent.get_attribute('innerHTML'))
-
-        if len(dfs) > 1:
-            logger.warning(f'More than one table returned, just returning the first one.')
+    def _goto_assignment(self, assignment_name, url):
+        logger.info(f'Going to url: {url}')
+        xpath = f'//*[@id="content"]//h2[contains(text(), "{assignment_name}")]'
+        with self.timings.step('navigation', assignment_name):
+            self._driver.get(url)
+            self._wait().until(
+                EC.presence_of_element_located((By.XPATH, xpath))
+            )
 
-        return dfs[0]
+    def _prefetch(self, url):
+        self._driver.execute_script(_PREFETCH_JS, url)
 
     def _goto_assignments(self):
         self.goto(f'/enterprise/{self.org_name}/assignments')
-        WebDriverWait(self._driver, 10).until(
+        self._wait().until(
             EC.presence_of_element_located((By.XPATH, '//*[@id="content"]//h2[contains(text(), "Assignments")]'))
         )
 
+    def _wait(self, element=None) -> WebDriverWait:
+        return WebDriverWait(element or self._driver, self.TIMEOUT)
+
 
 if __name__ == '__main__':
     import secrets
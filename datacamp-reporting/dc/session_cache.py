@@ -0,0 +1,82 @@
+"""
+Keeps the cookies of a logged in DataCamp session between runs, so the login
+form only has to be filled in again once the session expires.
+
+Cookies are stored per email under ~/.cache/dc-reports (or $DATACAMP_CACHE_DIR),
+readable by the current user only.
+"""
+import hashlib
+import json
+import logging
+import os
+import tempfile
+from pathlib import Path
+from typing import List, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = Path(os.environ.get('DATACAMP_CACHE_DIR', Path.home() / '.cache' / 'dc-reports'))
+# the cookie fields selenium's add_cookie accepts
+COOKIE_FIELDS = ['name', 'value', 'path', 'domain', 'secure', 'httpOnly', 'expiry']
+
+
+def _cookie_path(email: str) -> Path:
+    return CACHE_DIR / f'cookies-{hashlib.sha256(email.lower().encode()).hexdigest()[:16]}.json'
+
+
+def load_cookies(email: str) -> Optional[List[dict]]:
+    path = _cookie_path(email)
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def save_cookies(email: str, cookies: List[dict]):
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    os.chmod(CACHE_DIR, 0o700)
+
+    path = _cookie_path(email)
+    # unique per call, so threads saving at once don't share a temp file; created 0600
+    fd, tmp_path = tempfile.mkstemp(dir=CACHE_DIR, prefix=path.stem + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump([{k: c[k] for k in COOKIE_FIELDS if k in c} for c in cookies], f)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    logger.info(f'Saved session cookies to {path}')
+
+
+def clear_cookies(email: str):
+    try:
+        _cookie_path(email).unlink()
+    except FileNotFoundError:
+        pass
+
+
+def cookies_are_valid(cookies: List[dict], sign_in_url: str) -> bool:
+    """
+    A logged in session gets redirected away from the sign in page, an
+    expired one gets the form. One request, no page rendering.
+    """
+    jar = requests.cookies.RequestsCookieJar()
+    for c in cookies:
+        jar.set(c['name'], c['value'], domain=c.get('domain'), path=c.get('path', '/'))
+
+    try:
+        res = requests.get(sign_in_url, cookies=jar, allow_redirects=False, timeout=10)
+    except requests.RequestException as e:
+        logger.warning(f'Could not check saved session: {e}')
+        return False
+
+    return res.is_redirect and 'sign_in' not in res.headers.get('Location', '')
+
+
+def has_valid_session(email: str, sign_in_url: str) -> bool:
+    cookies = load_cookies(email)
+    return cookies is not None and cookies_are_valid(cookies, sign_in_url)
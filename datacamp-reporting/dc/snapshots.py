@@ -0,0 +1,84 @@
+"""
+Dated Parquet snapshots of the DataCamp reports.
+
+Each run adds one partition per report, laid out as
+
+    <out_dir>/<report>/snapshot_date=<YYYY-MM-DD>/part.parquet
+
+so a query over weeks of history only reads the reports, columns and dates it
+asks for. Running twice on the same day replaces that day's partition.
+"""
+from datetime import date
+import logging
+from pathlib import Path
+from typing import List, Optional
+
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+PARTITION_COLUMN = 'snapshot_date'
+PART_FILE = 'part.parquet'
+
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError('Parquet output needs pyarrow. Install it with `pip install -e .[parquet]`.')
+
+
+def write_snapshot(df: pd.DataFrame, out_dir: Path, report: str, snapshot_date: date = None) -> Path:
+    _require_pyarrow()
+    snapshot_date = snapshot_date or date.today()
+
+    partition_dir = Path(out_dir) / report / f'{PARTITION_COLUMN}={snapshot_date.isoformat()}'
+    partition_dir.mkdir(parents=True, exist_ok=True)
+
+    path = partition_dir / PART_FILE
+    df.to_parquet(path, engine='pyarrow', index=False)
+    logger.info(f'Wrote {len(df)} rows to {path}')
+    return path
+
+
+def snapshot_dates(out_dir: Path, report: str) -> List[date]:
+    """
+    Dates with a snapshot of the report, oldest first, from the partition folder names.
+    """
+    prefix = f'{PARTITION_COLUMN}='
+    report_dir = Path(out_dir) / report
+    if not report_dir.is_dir():
+        return []
+    return sorted(
+        date.fromisoformat(path.name[len(prefix):])
+        for path in report_dir.iterdir()
+        if path.name.startswith(prefix) and (path / PART_FILE).exists()
+    )
+
+
+def read_snapshots(out_dir: Path, report: str, columns: Optional[List[str]] = None,
+                   start: date = None, end: date = None) -> pd.DataFrame:
+    """
+    Reads the snapshots of one report, with a `snapshot_date` column.
+    Only the given columns and the partitions between start and end
+    (inclusive) are read from disk.
+    """
+    _require_pyarrow()
+
+    filters = []
+    if start is not None:
+        filters.append((PARTITION_COLUMN, '>=', start.isoformat()))
+    if end is not None:
+        filters.append((PARTITION_COLUMN, '<=', end.isoformat()))
+
+    if columns is not None and PARTITION_COLUMN not in columns:
+        columns = columns + [PARTITION_COLUMN]
+
+    df = pd.read_parquet(
+        Path(out_dir) / report,
+        engine='pyarrow',
+        columns=columns,
+        filters=filters or None,
+    )
+    df[PARTITION_COLUMN] = pd.to_datetime(df[PARTITION_COLUMN].astype(str))
+    return df
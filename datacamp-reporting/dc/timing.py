@@ -0,0 +1,42 @@
+from contextlib import contextmanager
+import time
+
+import pandas as pd
+
+
+class Timings:
+    """
+    Records how long each step of a scrape takes, e.g.
+
+        with timings.step('navigation', url):
+            driver.get(url)
+    """
+
+    COLUMNS = ['step', 'detail', 'started', 'seconds']
+
+    def __init__(self):
+        self.records = []
+
+    @contextmanager
+    def step(self, name: str, detail: str = ''):
+        started = time.time()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.records.append((name, detail, started, time.perf_counter() - start))
+
+    def to_df(self) -> pd.DataFrame:
+        df = pd.DataFrame(self.records, columns=self.COLUMNS)
+        df['started'] = pd.to_datetime(df['started'], unit='s')
+        return df
+
+
+def latency_summary(timings_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Per step count, total, mean and max seconds, slowest total first.
+    """
+    return timings_df \
+        .groupby('step')['seconds'] \
+        .agg(['count', 'sum', 'mean', 'max']) \
+        .sort_values('sum', ascending=False)
@@ -8,12 +8,16 @@ setup(
       author_email='taylorperkins.dev@gmail.com',
       license='MIT',
       packages=['dc'],
-      scripts=['bin/dc-reports'],
+      scripts=['bin/dc-reports', 'bin/dc-engagement'],
       install_requires=[
             'selenium==3.141.0',
             'pandas==0.25.3',
             'lxml',
-            'html5lib'
+            'html5lib',
+            'requests'
       ],
+      extras_require={
+            'parquet': ['pyarrow']
+      },
       zip_safe=False
 )
@@ -0,0 +1,370 @@
+"""
+Github API helpers shared by repodelete, repoprivatizer and github_checker.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import parse_qs, urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+
+# overridable so the tools can be pointed at a local stub server
+GITHUB_API = os.environ.get("GITHUB_API_URL", "https://api.github.com")
+GITHUB_GET_REPOS_API = GITHUB_API + "/orgs/{}/repos"
+GITHUB_GRAPHQL_API = GITHUB_API + "/graphql"
+CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "nss-utilities", "github")
+PER_PAGE = 100
+MAX_WORKERS = 8
+MAX_RETRIES = 5
+# seconds, doubled on each retry
+BACKOFF = 1.0
+# seconds to connect and to wait for each read of the response, so a stalled
+# connection fails (and is retried) instead of hanging its thread
+TIMEOUT = (10, 60)
+# stop and wait for the reset once this few requests are left in the window
+RATE_LIMIT_FLOOR = 10
+# values accepted by the `type` parameter of the org repos endpoint
+REPO_TYPES = ["all", "public", "private", "forks", "sources", "member"]
+# values accepted by the `privacy` argument of organization.repositories
+REPO_PRIVACIES = ["PUBLIC", "PRIVATE"]
+# response headers kept in the ETag cache so cached pages can still be paginated
+CACHED_HEADERS = ["Content-Type", "ETag", "Link"]
+
+
+def headers(token, user_agent="nss-utilities"):
+    return {
+        "Authorization": f"Bearer {token}",
+        "Accept": "application/vnd.github.inertia-preview+json",
+        "User-Agent": user_agent,
+    }
+
+
+class Throttle:
+    """
+    Pause shared by all threads using a client, driven by GitHub's
+    Retry-After and X-RateLimit-* response headers.
+    """
+
+    def __init__(self, floor=RATE_LIMIT_FLOOR):
+        self.floor = floor
+        self._resume_at = 0.0
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            delay = self._resume_at - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    def pause(self, seconds):
+        with self._lock:
+            self._resume_at = max(self._resume_at, time.time() + seconds)
+
+    def update(self, res):
+        if "Retry-After" in res.headers:
+            self.pause(float(res.headers["Retry-After"]))
+        elif "X-RateLimit-Remaining" in res.headers:
+            remaining = int(res.headers["X-RateLimit-Remaining"])
+            if remaining <= self.floor:
+                reset = float(res.headers.get("X-RateLimit-Reset", time.time()))
+                self.pause(reset - time.time())
+
+
+def is_rate_limited(res):
+    return res.status_code == 429 or (
+        res.status_code == 403
+        and (
+            "Retry-After" in res.headers
+            or res.headers.get("X-RateLimit-Remaining") == "0"
+            or "secondary rate limit" in res.text.lower()
+        )
+    )
+
+
+def is_retryable(res):
+    return res.status_code >= 500 or is_rate_limited(res)
+
+
+class GitHubClient:
+    """
+    Thin wrapper around a pooled requests.Session that
+     - keeps connections alive across calls (pool_size connections per host)
+     - sends If-None-Match for GETs it has an ETag for, so unchanged
+       responses come back as a 304 that doesn't count against the rate limit
+     - retries 5xx and rate limited responses, connection errors and
+       timeouts with jittered exponential backoff
+
+    Paths ("/orgs/...") are resolved against GITHUB_API; full urls are used as is.
+    Pass cache_dir=None to turn off the on-disk ETag cache.
+    """
+
+    def __init__(self, token, user_agent="nss-utilities", pool_size=MAX_WORKERS,
+                 cache_dir=CACHE_DIR, max_retries=MAX_RETRIES, backoff=BACKOFF, timeout=TIMEOUT):
+        self.cache_dir = cache_dir
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+        self.throttle = Throttle()
+
+        self.session = requests.Session()
+        self.session.headers.update(headers(token, user_agent))
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.session.close()
+
+    def url(self, path):
+        return path if path.startswith("http") else GITHUB_API + path
+
+    def request(self, method, path, **kwargs):
+        '''
+        Sends a request, waiting out rate limits and retrying transient
+        failures. Returns the last response whatever its status, or raises
+        the last connection error or timeout once the retries run out.
+        '''
+        url = self.url(path)
+        kwargs.setdefault("timeout", self.timeout)
+        for attempt in range(self.max_retries + 1):
+            self.throttle.wait()
+            try:
+                res = self.session.request(method, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt == self.max_retries:
+                    raise
+                res = None
+            else:
+                self.throttle.update(res)
+                if not is_retryable(res) or attempt == self.max_retries:
+                    return res
+            if res is None or "Retry-After" not in res.headers:
+                delay = self.backoff * 2 ** attempt
+                time.sleep(delay + random.uniform(0, delay))
+        return res
+
+    def get(self, path, params=None, **kwargs):
+        '''
+        Conditional GET. A 304 is answered from the ETag cache and handed
+        back as a regular 200 response with `from_cache` set.
+        '''
+        if self.cache_dir is None:
+            return self.request("GET", path, params=params, **kwargs)
+
+        key = self._cache_key(self.url(path), params)
+        cached = self._read_cache(key)
+        request_headers = dict(kwargs.pop("headers", None) or {})
+        if cached is not None:
+            request_headers["If-None-Match"] = cached["headers"]["ETag"]
+
+        res = self.request("GET", path, params=params, headers=request_headers, **kwargs)
+
+        if res.status_code == 304 and cached is not None:
+            return self._cached_response(res, cached)
+        res.from_cache = False
+        if res.status_code == 200 and "ETag" in res.headers:
+            self._write_cache(key, res)
+        return res
+
+    def post(self, path, **kwargs):
+        return self.request("POST", path, **kwargs)
+
+    def graphql(self, query, variables=None):
+        '''
+        Runs a GraphQL query and returns its "data", raising on any errors.
+        '''
+        res = self.post(GITHUB_GRAPHQL_API, json={"query": query, "variables": variables or {}})
+        if res.status_code != 200:
+            raise Exception(f"ERROR: GraphQL query failed: {res.status_code} {res.text}")
+        body = res.json()
+        if body.get("errors"):
+            raise Exception(f"ERROR: GraphQL query failed: {body['errors']}")
+        return body["data"]
+
+    def patch(self, path, **kwargs):
+        return self.request("PATCH", path, **kwargs)
+
+    def delete(self, path, **kwargs):
+        return self.request("DELETE", path, **kwargs)
+
+    def _cache_key(self, url, params):
+        params = sorted((params or {}).items())
+        return hashlib.sha256(f"{url}?{params}".encode()).hexdigest()
+
+    def _read_cache(self, key):
+        try:
+            with open(os.path.join(self.cache_dir, key + ".json")) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _write_cache(self, key, res):
+        entry = {
+            "headers": {h: res.headers[h] for h in CACHED_HEADERS if h in res.headers},
+            "body": res.text,
+        }
+        path = os.path.join(self.cache_dir, key + ".json")
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(entry, f)
+        os.replace(tmp_path, path)
+
+    def _cached_response(self, not_modified, cached):
+        res = requests.Response()
+        res.status_code = 200
+        res.url = not_modified.url
+        res.request = not_modified.request
+        res.headers = CaseInsensitiveDict(cached["headers"])
+        res.encoding = "utf-8"
+        res._content = cached["body"].encode("utf-8")
+        res.from_cache = True
+        return res
+
+
+def run_on_repos(fn, repo_names, max_workers=MAX_WORKERS, action="Update", done="Updated", on_result=None):
+    """
+    Calls fn(repo_name) for every repo across a pool of worker threads. fn
+    returns None on success or an error message, so a failure doesn't stop
+    the others. Returns a summary of the form
+    {"ok": [repo_name, ...], "failed": {repo_name: error, ...}}
+    arg action / done: "Delete" / "Deleted", for the progress lines
+    arg on_result: called with (repo_name, error) as each repo finishes, e.g. to journal it
+    """
+    summary = {"ok": [], "failed": {}}
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = {pool.submit(fn, repo_name): repo_name for repo_name in repo_names}
+        for future in as_completed(futures):
+            repo_name = futures[future]
+            error = future.result()
+            if on_result is not None:
+                on_result(repo_name, error)
+            if error is None:
+                print(f"{done} {repo_name}")
+                summary["ok"].append(repo_name)
+            else:
+                print(f"ERROR: {action} failed for {repo_name}")
+                summary["failed"][repo_name] = error
+    return summary
+
+
+def print_summary(summary, done="updated"):
+    '''
+    Prints a run_on_repos summary, e.g. "3 repos deleted, 1 failed." and each failure.
+    '''
+    print(f"{len(summary['ok'])} repos {done}, {len(summary['failed'])} failed.")
+    for repo_name, error in sorted(summary["failed"].items()):
+        print(f"  {repo_name}: {error}")
+
+
+def parse_link_header(link):
+    '''
+    Parses a Link header into a dict of rel -> url, e.g. {"next": ..., "last": ...}
+    '''
+    links = {}
+    for part in link.split(","):
+        match = re.search(r'<([^>]+)>;\s*rel="(\w+)"', part)
+        if match:
+            links[match.group(2)] = match.group(1)
+    return links
+
+
+def last_page(res):
+    '''
+    Returns the last page number advertised in a response's Link header,
+    or 1 when the listing fits on a single page.
+    '''
+    last = parse_link_header(res.headers.get("Link", "")).get("last")
+    if last is None:
+        return 1
+    return int(parse_qs(urlparse(last).query)["page"][0])
+
+
+def iter_org_repos(org, client, repo_type="all", max_workers=MAX_WORKERS):
+    '''
+    Yields every repo object in an org. The first page is fetched to learn
+    the page count from the Link header, then the remaining pages are
+    fetched concurrently and yielded as they arrive (not in page order).
+    arg client: GitHubClient
+    arg repo_type: server side filter, one of REPO_TYPES
+    '''
+    if repo_type not in REPO_TYPES:
+        raise ValueError(f"repo_type must be one of {REPO_TYPES}, not {repo_type!r}")
+
+    url = GITHUB_GET_REPOS_API.format(org)
+    params = {"type": repo_type, "per_page": PER_PAGE}
+
+    def get_page(page):
+        res = client.get(url, params={**params, "page": page})
+        if res.status_code != 200:
+            raise Exception(f"ERROR: Listing page {page} of {org} repos failed: {res.status_code} {res.text}")
+        return res
+
+    first = get_page(1)
+    yield from first.json()
+
+    pages = range(2, last_page(first) + 1)
+    if not pages:
+        return
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        futures = [pool.submit(get_page, page) for page in pages]
+        for future in as_completed(futures):
+            yield from future.result().json()
+
+
+def iter_org_repo_names(org, client, repo_type="all", max_workers=MAX_WORKERS):
+    '''
+    Yields the full_name ("org/repo") of every repo in an org as it arrives.
+    '''
+    for repo in iter_org_repos(org, client, repo_type=repo_type, max_workers=max_workers):
+        yield repo["full_name"]
+
+
+ORG_REPOS_QUERY = """
+query($org: String!, $privacy: RepositoryPrivacy, $cursor: String) {
+  organization(login: $org) {
+    repositories(privacy: $privacy, first: 100, after: $cursor) {
+      pageInfo { hasNextPage endCursor }
+      nodes { nameWithOwner isPrivate }
+    }
+  }
+}
+"""
+
+
+def iter_org_repos_graphql(org, client, privacy=None):
+    '''
+    GraphQL alternative to iter_org_repos that only asks for the fields the
+    repo tools use, 100 repos per request. Yields dicts with the same
+    "full_name" and "private" keys as the REST repo objects.
+    arg privacy: server side filter, one of REPO_PRIVACIES or None for all repos
+    '''
+    if privacy is not None and privacy not in REPO_PRIVACIES:
+        raise ValueError(f"privacy must be one of {REPO_PRIVACIES}, not {privacy!r}")
+
+    variables = {"org": org, "privacy": privacy, "cursor": None}
+    while True:
+        data = client.graphql(ORG_REPOS_QUERY, variables)
+        if data["organization"] is None:
+            raise Exception(f"ERROR: Organization {org} not found")
+        repositories = data["organization"]["repositories"]
+        for node in repositories["nodes"]:
+            yield {"full_name": node["nameWithOwner"], "private": node["isPrivate"]}
+        if not repositories["pageInfo"]["hasNextPage"]:
+            return
+        variables["cursor"] = repositories["pageInfo"]["endCursor"]
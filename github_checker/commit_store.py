@@ -0,0 +1,127 @@
+"""
+SQLite store of the commits harvested from student repos.
+
+Commits are keyed by (repo_name, sha), so history shared between branches is
+only stored once, and the harvester can stop walking a branch as soon as it
+reaches a commit that is already here. The head and newest commit date of
+each branch are kept alongside so unchanged branches can be skipped.
+"""
+import sqlite3
+
+import pandas as pd
+
+STORE_FILE = "commits.sqlite"
+COLUMNS = ["repo_name", "sha", "date", "committer", "message"]
+BOT_COMMITTERS = ["github-classroom[bot]"]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS commits (
+    repo_name TEXT NOT NULL,
+    sha TEXT NOT NULL,
+    date TEXT NOT NULL,
+    committer TEXT,
+    message TEXT,
+    PRIMARY KEY (repo_name, sha)
+);
+CREATE INDEX IF NOT EXISTS commits_date ON commits (repo_name, date);
+CREATE TABLE IF NOT EXISTS branches (
+    repo_name TEXT NOT NULL,
+    branch TEXT NOT NULL,
+    head_sha TEXT NOT NULL,
+    since TEXT,
+    PRIMARY KEY (repo_name, branch)
+);
+"""
+
+
+class CommitStore:
+
+    def __init__(self, path=STORE_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def shas(self, repo_name):
+        rows = self.conn.execute("SELECT sha FROM commits WHERE repo_name = ?", (repo_name,))
+        return {sha for sha, in rows}
+
+    def add_commits(self, rows):
+        '''
+        Adds (repo_name, sha, date, committer, message) rows, ignoring ones already stored.
+        '''
+        with self.conn:
+            self.conn.executemany("INSERT OR IGNORE INTO commits VALUES (?, ?, ?, ?, ?)", rows)
+
+    def branch(self, repo_name, branch):
+        '''
+        Returns (head_sha, since) as of the last harvest, or (None, None).
+        '''
+        row = self.conn.execute(
+            "SELECT head_sha, since FROM branches WHERE repo_name = ? AND branch = ?",
+            (repo_name, branch),
+        ).fetchone()
+        return row or (None, None)
+
+    def set_branch(self, repo_name, branch, head_sha, since):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO branches VALUES (?, ?, ?, ?)",
+                (repo_name, branch, head_sha, since),
+            )
+
+    def forget_branches(self):
+        '''
+        Drops the saved branch heads so the next harvest walks every branch again.
+        '''
+        with self.conn:
+            self.conn.execute("DELETE FROM branches")
+
+    def commits(self, repos=None):
+        '''
+        Returns the stored commits, optionally only for some repos, as a DataFrame.
+        '''
+        query = "SELECT * FROM commits"
+        params = []
+        if repos is not None:
+            repos = list(repos)
+            query += f" WHERE repo_name IN ({','.join('?' * len(repos))})"
+            params = repos
+        df = pd.read_sql_query(query, self.conn, params=params)
+        df['date'] = pd.to_datetime(df['date'], utc=True)
+        return df
+
+    def summary(self, by=("repo_name",), repos=None, ignore_committers=BOT_COMMITTERS):
+        '''
+        Commit count and latest commit date grouped by some of the columns,
+        computed in SQLite rather than by loading every commit.
+        '''
+        by = list(by)
+        if not set(by) <= set(COLUMNS):
+            raise ValueError(f"can only group by {COLUMNS}")
+        conditions, params = [], []
+        if ignore_committers:
+            conditions.append(f"committer NOT IN ({','.join('?' * len(ignore_committers))})")
+            params.extend(ignore_committers)
+        if repos is not None:
+            repos = list(repos)
+            conditions.append(f"repo_name IN ({','.join('?' * len(repos))})")
+            params.extend(repos)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        columns = ", ".join(by)
+        df = pd.read_sql_query(
+            f"SELECT {columns}, COUNT(*) AS count, MAX(date) AS max "
+            f"FROM commits {where} GROUP BY {columns} ORDER BY {columns}",
+            self.conn,
+            params=params,
+        )
+        df['max'] = pd.to_datetime(df['max'], utc=True)
+        return df.set_index(by)
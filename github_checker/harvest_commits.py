@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+"""
+Collects the commits on every branch of a set of repos and reports when each
+repo was last committed to.
+
+Repos are harvested concurrently and every page is followed. Commits are
+kept in a CommitStore: branches whose head hasn't moved are skipped, moved
+ones are only asked for commits made `since` the last run, and a branch is
+no longer walked once it reaches a commit that is already stored, so shared
+history is only downloaded once.
+
+    python harvest_commits.py --org nss-data-science-cohort-5 --project hmda_shiny
+    python harvest_commits.py https://github.com/someone/some_repo.git --cutoff 3d
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from github_api import GitHubClient, iter_org_repos, parse_link_header  # noqa: E402
+from commit_store import COLUMNS, STORE_FILE, CommitStore  # noqa: E402
+from repo_index import INDEX_FILE, RepoIndex, refresh  # noqa: E402
+
+TOKEN_FILE = "token.json"
+MAX_WORKERS = 16
+PER_PAGE = 100
+
+
+def prepare_repo_name(repo_name):
+    if repo_name[:19] == 'https://github.com/':
+        repo_name = repo_name[19:]
+    if repo_name[-4:] == '.git':
+        repo_name = repo_name[:-4]
+
+    return repo_name
+
+
+def load_token(path=TOKEN_FILE):
+    with open(path) as fi:
+        return json.load(fi)['token']
+
+
+def find_project_repos(org, project_name, client, index=None):
+    '''
+    Returns the "org/repo" names of every student repo for a Github Classroom
+    assignment, leaving out the original template repository.
+    arg index: RepoIndex to bring up to date and look the repos up in by name
+        prefix (Classroom names them project_name-username), instead of
+        listing the whole org
+    '''
+    if index is not None:
+        refresh(index, org, client)
+        return [name for name in index.find(org, project_name) if name != f"{org}/{project_name}"]
+    return sorted(
+        repo['full_name'] for repo in iter_org_repos(org, client)
+        if project_name in repo['name'] and repo['name'] != project_name
+    )
+
+
+class Harvester:
+    """
+    Fetches branches and commits for many repos at once. Requests run on a
+    bounded thread pool behind asyncio so the shared GitHubClient keeps
+    handling connection reuse, caching and retries. Branches within a repo
+    are walked one after the other, default branch first, so each one can
+    stop where it meets history already fetched.
+    """
+
+    def __init__(self, client, store, max_workers=MAX_WORKERS):
+        self.client = client
+        self.store = store
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.errors = {}
+
+    async def pages(self, path, params=None):
+        '''
+        Yields every page of a listing by following the Link headers.
+        '''
+        loop = asyncio.get_running_loop()
+        url = path
+        params = {"per_page": PER_PAGE, **(params or {})}
+        while url:
+            res = await loop.run_in_executor(self.executor, partial(self.client.get, url, params=params))
+            # empty repos have no commits to list
+            if res.status_code == 409:
+                return
+            if res.status_code != 200:
+                raise Exception(f"ERROR: GET {url} failed: {res.status_code} {res.text}")
+            yield res.json()
+            # the next link already carries the query string
+            url, params = parse_link_header(res.headers.get("Link", "")).get("next"), None
+
+    async def harvest_branch(self, repo, branch, known):
+        head = branch['commit']['sha']
+        head_sha, since = self.store.branch(repo, branch['name'])
+        if head == head_sha or head in known:
+            self.store.set_branch(repo, branch['name'], head, since)
+            return []
+
+        params = {'sha': head}
+        if since is not None:
+            params['since'] = since
+        rows = []
+        async for page in self.pages(f'/repos/{repo}/commits', params):
+            for commit in page:
+                if commit['sha'] in known:
+                    break
+                known.add(commit['sha'])
+                since = max(since or '', commit['commit']['committer']['date'])
+                rows.append((repo,
+                             commit['sha'],
+                             commit['commit']['author']['date'],
+                             commit['commit']['author']['name'],
+                             commit['commit']['message']))
+            else:
+                continue
+            break
+
+        self.store.add_commits(rows)
+        self.store.set_branch(repo, branch['name'], head, since)
+        return rows
+
+    async def harvest_repo(self, repo):
+        branches = [branch async for page in self.pages(f'/repos/{repo}/branches') for branch in page]
+        # the default branch holds most of the history, so walk it first
+        branches.sort(key=lambda b: b['name'] not in ('main', 'master'))
+        known = self.store.shas(repo)
+        rows = []
+        for branch in branches:
+            rows.extend(await self.harvest_branch(repo, branch, known))
+        return rows
+
+    async def try_harvest_repo(self, repo):
+        '''
+        harvest_repo, recording the error instead of raising so one deleted
+        or renamed repo doesn't stop the others.
+        '''
+        try:
+            return await self.harvest_repo(repo)
+        except Exception as e:
+            self.errors[repo] = str(e)
+            return []
+
+    async def harvest_async(self, repos):
+        results = await asyncio.gather(*[self.try_harvest_repo(repo) for repo in repos])
+        return [row for rows in results for row in rows]
+
+    def harvest(self, repos):
+        '''
+        Stores the commits made since the last run and returns them as a
+        DataFrame, one row per commit. Repos that failed are in self.errors
+        as {repo: error}.
+        '''
+        try:
+            rows = asyncio.run(self.harvest_async(repos))
+        finally:
+            self.executor.shutdown()
+        commits = pd.DataFrame(rows, columns=COLUMNS)
+        commits['date'] = pd.to_datetime(commits['date'], utc=True)
+        return commits
+
+
+def harvest(repos, client, store, max_workers=MAX_WORKERS, errors=None):
+    '''
+    Fetches the new commits for repos into a CommitStore and returns them.
+    arg errors: dict to fill with {repo: error} for repos that couldn't be
+        fetched (e.g. a 404 for a deleted or renamed repo), the rest are
+        harvested anyway
+    '''
+    harvester = Harvester(client, store, max_workers=max_workers)
+    commits = harvester.harvest([prepare_repo_name(repo) for repo in repos])
+    if errors is not None:
+        errors.update(harvester.errors)
+    return commits
+
+
+def summarize(store, repos=None, errors=None):
+    '''
+    Commit count and latest commit per repo, with how long ago that was.
+    Given repos are all listed, those without a (non bot) commit with a
+    count of 0 and no latest commit. errors adds an error column.
+    '''
+    if repos is not None:
+        repos = list(dict.fromkeys(prepare_repo_name(repo) for repo in repos))
+    latest = store.summary(by=['repo_name'], repos=repos)
+    if repos is not None:
+        latest = latest.reindex(pd.Index(repos, name='repo_name'))
+        latest['count'] = latest['count'].fillna(0).astype(int)
+    latest['time_since_last_commit'] = pd.Timestamp.now(tz='UTC') - latest['max']
+    if errors:
+        latest['error'] = pd.Series(errors, dtype=object)
+    return latest
+
+
+def not_committed_since(latest, cutoff):
+    '''
+    The rows of summarize without a commit in cutoff (e.g. '3d'), including
+    repos never committed to and ones that couldn't be checked.
+    '''
+    stale = latest['time_since_last_commit'].isna() | (latest['time_since_last_commit'] > pd.to_timedelta(cutoff))
+    if 'error' in latest:
+        stale |= latest['error'].notna()
+    return latest[stale]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check when student repos were last committed to.")
+    parser.add_argument("repos", nargs="*", help="Repos to check, as org/repo or a github url.")
+    parser.add_argument("--org", help="Github Classroom org to find repos in (use with --project).")
+    parser.add_argument("--project", help="Only check repos in --org whose name starts with this.")
+    parser.add_argument("--token-file", default=TOKEN_FILE, help=f"(default: {TOKEN_FILE})")
+    parser.add_argument("--store", default=STORE_FILE, help=f"Every commit seen so far. (default: {STORE_FILE})")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Number of requests to run at once.")
+    parser.add_argument("--full", action="store_true", help="Walk every branch again, even if unchanged.")
+    parser.add_argument("--repo-index", default=INDEX_FILE,
+                        help=f"Repos seen in each --org, only updated ones are fetched again. (default: {INDEX_FILE})")
+    parser.add_argument("--relist", action="store_true", help="List every repo in --org again, e.g. after deleting some.")
+    parser.add_argument("--cutoff", help="Only show repos without a commit in this long, e.g. 3d.")
+    args = parser.parse_args()
+    if not args.repos and not (args.org and args.project):
+        parser.error("give some repos, or --org and --project")
+    return args
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    client = GitHubClient(load_token(args.token_file), user_agent="github_checker", pool_size=args.workers)
+    store = CommitStore(args.store)
+    if args.full:
+        store.forget_branches()
+
+    repos = list(args.repos)
+    if args.org:
+        with RepoIndex(args.repo_index) as index:
+            if args.relist:
+                refresh(index, args.org, client, full=True)
+            repos += find_project_repos(args.org, args.project, client, index=index)
+
+    errors = {}
+    new_commits = harvest(repos, client, store, max_workers=args.workers, errors=errors)
+    print(f"Fetched {len(new_commits)} new commits from {len(repos)} repos.")
+    for repo, error in sorted(errors.items()):
+        print(f"ERROR: Could not check {repo}: {error}")
+
+    latest = summarize(store, repos, errors=errors)
+    if args.cutoff:
+        latest = not_committed_since(latest, args.cutoff)
+    print(latest.to_string())
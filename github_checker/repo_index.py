@@ -0,0 +1,133 @@
+"""
+SQLite index of the repos in Github orgs, so finding the repos of a Github
+Classroom assignment is a local prefix query instead of listing the whole org.
+
+The first refresh of an org lists every repo. After that only the repos
+updated since the newest `updated_at` already indexed are fetched, by asking
+Github for the org's repos most recently updated first and stopping at that
+high-water mark. Deleted repos aren't noticed by an incremental refresh, a
+full one replaces the org's repos.
+"""
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from github_api import GITHUB_GET_REPOS_API, PER_PAGE, iter_org_repos, parse_link_header  # noqa: E402
+
+INDEX_FILE = "repos.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS repos (
+    org TEXT NOT NULL,
+    name TEXT NOT NULL,
+    full_name TEXT NOT NULL,
+    created_at TEXT,
+    updated_at TEXT,
+    pushed_at TEXT,
+    private INTEGER,
+    archived INTEGER,
+    PRIMARY KEY (org, name)
+);
+CREATE TABLE IF NOT EXISTS orgs (
+    org TEXT PRIMARY KEY,
+    high_water TEXT NOT NULL
+);
+"""
+
+
+def repo_row(org, repo):
+    return (
+        org,
+        repo["name"],
+        repo["full_name"],
+        repo.get("created_at"),
+        repo.get("updated_at"),
+        repo.get("pushed_at"),
+        int(bool(repo.get("private"))),
+        int(bool(repo.get("archived"))),
+    )
+
+
+class RepoIndex:
+
+    def __init__(self, path=INDEX_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def high_water(self, org):
+        '''
+        Newest updated_at indexed for the org, or None if it was never indexed.
+        '''
+        row = self.conn.execute("SELECT high_water FROM orgs WHERE org = ?", (org,)).fetchone()
+        return row[0] if row else None
+
+    def add_repos(self, org, repos, replace=False):
+        '''
+        Adds or updates repo objects from the org repos endpoint, moving the
+        org's high-water mark up to the newest updated_at among them.
+        With replace, the org's other repos are dropped.
+        '''
+        rows = [repo_row(org, repo) for repo in repos]
+        high_water = max([self.high_water(org) or ""] + [row[4] or "" for row in rows])
+        with self.conn:
+            if replace:
+                self.conn.execute("DELETE FROM repos WHERE org = ?", (org,))
+            self.conn.executemany("INSERT OR REPLACE INTO repos VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            if high_water:
+                self.conn.execute("INSERT OR REPLACE INTO orgs VALUES (?, ?)", (org, high_water))
+
+    def find(self, org, prefix=""):
+        '''
+        "org/repo" names of the org's repos whose name starts with prefix
+        (case sensitive), answered from the primary key index.
+        '''
+        rows = self.conn.execute(
+            "SELECT full_name FROM repos WHERE org = ? AND name >= ? AND name < ? ORDER BY name",
+            (org, prefix, prefix + "\U0010ffff"),
+        )
+        return [full_name for full_name, in rows]
+
+
+def updated_since(org, client, high_water):
+    '''
+    Yields the org's repos updated at or after high_water, following pages
+    of the most recently updated first until one reaches older repos.
+    '''
+    url = GITHUB_GET_REPOS_API.format(org)
+    params = {"sort": "updated", "direction": "desc", "per_page": PER_PAGE}
+    while url:
+        res = client.get(url, params=params)
+        if res.status_code != 200:
+            raise Exception(f"ERROR: Listing {org} repos failed: {res.status_code} {res.text}")
+        page = res.json()
+        yield from (repo for repo in page if repo["updated_at"] >= high_water)
+        if not page or page[-1]["updated_at"] < high_water:
+            return
+        # the next link already carries the query string
+        url, params = parse_link_header(res.headers.get("Link", "")).get("next"), None
+
+
+def refresh(index, org, client, full=False):
+    '''
+    Brings the index of an org up to date, fetching every repo the first
+    time (or with full) and only recently updated ones after that.
+    Returns how many repos were fetched.
+    '''
+    high_water = None if full else index.high_water(org)
+    if high_water is None:
+        repos = list(iter_org_repos(org, client))
+    else:
+        repos = list(updated_since(org, client, high_water))
+    index.add_repos(org, repos, replace=high_water is None)
+    return len(repos)
@@ -0,0 +1,150 @@
+"""
+Picks which repos a bulk tool (repodelete, repoprivatizer) should act on.
+
+Names are matched case-insensitively through a case-folded set, so splitting
+n repos against a keep-list of m names takes O(n + m) instead of O(n * m).
+Entries can also be glob patterns ("org/*-capstone") or, prefixed with "re:",
+regular expressions ("re:org/.*_(final|capstone)$").
+"""
+import fnmatch
+import re
+import sys
+
+REGEX_PREFIX = "re:"
+GLOB_CHARS = set("*?[")
+
+
+def is_pattern(entry):
+    return entry.startswith(REGEX_PREFIX) or bool(GLOB_CHARS & set(entry))
+
+
+def load_names(source):
+    '''
+    Reads one repo name or pattern per line from a file, or from stdin when
+    source is "-" (stopping at the first blank line so later prompts can
+    still read stdin). Lines starting with # are ignored.
+    '''
+    if source == "-":
+        lines = []
+        for line in sys.stdin:
+            if not line.strip():
+                break
+            lines.append(line)
+    else:
+        with open(source) as f:
+            lines = f.readlines()
+    return [line.strip() for line in lines if line.strip() and not line.strip().startswith("#")]
+
+
+def qualify(entries, org):
+    '''
+    Prefixes entries that don't name an org with "org/", leaving regexes alone.
+    '''
+    return [
+        entry if "/" in entry or entry.startswith(REGEX_PREFIX) else f"{org}/{entry}"
+        for entry in entries
+    ]
+
+
+class Matcher:
+    """
+    Case-insensitive membership test for a list of names and patterns.
+    Exact names go in a case-folded set; patterns are compiled into a
+    single regex so each name is checked in one pass.
+    """
+
+    def __init__(self, entries):
+        self.names = set()
+        patterns = []
+        for entry in entries:
+            if entry.startswith(REGEX_PREFIX):
+                patterns.append(f"(?:{entry[len(REGEX_PREFIX):]})")
+            elif is_pattern(entry):
+                patterns.append(fnmatch.translate(entry))
+            else:
+                self.names.add(entry.casefold())
+        self.pattern = re.compile("|".join(patterns), re.IGNORECASE) if patterns else None
+
+    def __contains__(self, name):
+        if name.casefold() in self.names:
+            return True
+        return self.pattern is not None and self.pattern.fullmatch(name) is not None
+
+
+def partition(names, keep=(), only=None):
+    '''
+    Splits names into (selected, kept), preserving order.
+    arg keep: names/patterns to leave alone
+    arg only: if given, names/patterns to restrict the selection to; everything else is kept
+    '''
+    keep = Matcher(keep)
+    only = Matcher(only) if only is not None else None
+    selected, kept = [], []
+    for name in names:
+        if name in keep or (only is not None and name not in only):
+            kept.append(name)
+        else:
+            selected.append(name)
+    return selected, kept
+
+
+def add_arguments(parser):
+    parser.add_argument(
+        "--keep",
+        action="append",
+        metavar="NAME_OR_PATTERN",
+        help="Repo or pattern to leave alone. Can be given more than once.",
+    )
+    parser.add_argument(
+        "--keep-file",
+        metavar="PATH",
+        help="File of repos/patterns to leave alone, one per line ('-' for stdin).",
+    )
+    parser.add_argument(
+        "--only",
+        action="append",
+        metavar="NAME_OR_PATTERN",
+        help="Only act on repos matching this. Can be given more than once.",
+    )
+    parser.add_argument(
+        "--only-file",
+        metavar="PATH",
+        help="File of repos/patterns to restrict to, one per line ('-' for stdin).",
+    )
+
+
+def selection_from_args(args):
+    '''
+    Returns the (keep, only) entries given on the command line. Either is
+    None when its options weren't used.
+    '''
+    def entries(values, path):
+        if values is None and path is None:
+            return None
+        return (values or []) + (load_names(path) if path is not None else [])
+
+    return entries(args.keep, args.keep_file), entries(args.only, args.only_file)
+
+
+def diff_lists(list1, list2):
+    '''
+    Returns the elements of list1 not in list2, ignoring case.
+    '''
+    return partition(list1, keep=list2)[0]
+
+
+if __name__ == "__main__":
+    # micro-benchmark against the old list based diff
+    import timeit
+
+    names = [f"org/repo-{i}" for i in range(10_000)]
+    keep = [f"ORG/REPO-{i}" for i in range(0, 20_000, 2)]
+
+    def list_diff(list1, list2):
+        upper_list2 = [el.upper() for el in list2]
+        return [el for el in list1 if el.upper() not in upper_list2]
+
+    assert diff_lists(names, keep) == list_diff(names, keep)
+    print(f"diff_lists 10k x 10k:  {timeit.timeit(lambda: diff_lists(names, keep), number=10) / 10:.4f}s")
+    print(f"list based 10k x 10k:  {timeit.timeit(lambda: list_diff(names, keep), number=1):.4f}s")
+    print(f"with a glob pattern:   {timeit.timeit(lambda: diff_lists(names, keep + ['org/*-99']), number=10) / 10:.4f}s")
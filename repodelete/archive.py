@@ -0,0 +1,124 @@
+"""
+Downloads a tarball of each repo before repodelete deletes it.
+
+Tarballs are streamed to disk a chunk at a time, so memory use doesn't grow
+with the size of a repo, and several are downloaded at once. Each one is
+written to a .part file, hashed as it arrives, checked against the
+Content-Length and for being a complete gzip stream, and only then renamed
+into place next to a small JSON record of its size and sha256. Repos whose
+archive is already on disk and matches its record aren't downloaded again.
+"""
+import gzip
+import hashlib
+import json
+import os
+import time
+
+import requests
+
+from github_api import run_on_repos
+
+GITHUB_TARBALL_API = "/repos/{}/tarball"
+ARCHIVE_DIR = "archives"
+CHUNK_SIZE = 1 << 20
+MAX_WORKERS = 4
+
+
+def archive_path(archive_dir, repo_name):
+    return os.path.join(archive_dir, f"{repo_name}.tar.gz")
+
+
+def read_record(path):
+    try:
+        with open(path + ".json") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def is_archived(path):
+    '''
+    Whether a finished archive is on disk with the size and hash it was recorded with.
+    '''
+    record = read_record(path)
+    if record is None:
+        return False
+    if record.get("empty"):
+        return True
+    return os.path.exists(path) and os.path.getsize(path) == record["bytes"] and file_sha256(path) == record["sha256"]
+
+
+def is_complete_gzip(path):
+    '''
+    Reads the whole gzip stream, which fails on a truncated file or a CRC mismatch.
+    '''
+    try:
+        with gzip.open(path, "rb") as f:
+            while f.read(CHUNK_SIZE):
+                pass
+    except (OSError, EOFError):
+        return False
+    return True
+
+
+def download_archive(repo_name, client, archive_dir=ARCHIVE_DIR, empty=False):
+    """
+    Streams a repo's tarball to archive_dir/org/repo.tar.gz. Returns None
+    once the archive is on disk and verified, or an error message.
+    arg empty: the repo has no commits, so there's no tarball to get (Github answers 404)
+    """
+    path = archive_path(archive_dir, repo_name)
+    if is_archived(path):
+        return None
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    try:
+        res = client.request("GET", GITHUB_TARBALL_API.format(repo_name), stream=True)
+        if res.status_code == 404 and empty:
+            res.close()
+            record = {"repo": repo_name, "empty": True, "time": time.time()}
+        elif res.status_code != 200:
+            res.close()
+            return f"{res.status_code}: {res.reason}"
+        else:
+            part_path = path + ".part"
+            h, size = hashlib.sha256(), 0
+            with res, open(part_path, "wb") as f:
+                for chunk in res.iter_content(CHUNK_SIZE):
+                    f.write(chunk)
+                    h.update(chunk)
+                    size += len(chunk)
+
+            # iter_content undoes any Content-Encoding, so the length is only comparable without one
+            expected = res.headers.get("Content-Length")
+            if expected is not None and "Content-Encoding" not in res.headers and int(expected) != size:
+                return f"incomplete download: {size} of {expected} bytes"
+            if not is_complete_gzip(part_path):
+                return "incomplete download: not a complete gzip file"
+            os.replace(part_path, path)
+            record = {"repo": repo_name, "bytes": size, "sha256": h.hexdigest(), "time": time.time()}
+    except requests.RequestException as e:
+        return str(e)
+
+    with open(path + ".json", "w") as f:
+        json.dump(record, f)
+    return None
+
+
+def archive_repos_concurrently(repo_names, client, archive_dir=ARCHIVE_DIR, max_workers=MAX_WORKERS, empty=()):
+    """
+    Downloads the repos' tarballs across a pool of worker threads. Returns a
+    run_on_repos summary: {"ok": [repo_name, ...], "failed": {repo_name: error, ...}}
+    arg empty: names of repos without commits
+    """
+    empty = set(empty)
+    return run_on_repos(lambda repo_name: download_archive(repo_name, client, archive_dir, repo_name in empty),
+                        repo_names, max_workers=max_workers, action="Archive", done="Archived")
@@ -1,43 +1,67 @@
 #!/usr/bin/env python
 # thank you Andy
+import argparse
+import os
+import sys
+from functools import partial
+
 import requests
-import getpass
 import configparser
 
-GITHUB_GET_REPOS_API = "https://api.github.com/orgs/{}/repos"
-GITHUB_REPO_API = "https://api.github.com/repos/{}"
-CONFIG_FILE = "config.ini"
-
-
-def get_all_repos(org, token):
-    return requests.get(GITHUB_GET_REPOS_API.format(org), headers=headers(token)).json()
-
-
-def delete_repo(repo_name, token):
-    res = requests.delete(GITHUB_REPO_API.format(repo_name), headers=headers(token))
-    if res.status_code < 200 or res.status_code > 300:
-        print(f"ERROR: Delete failed for {repo_name}")
-        print(res.json())
-        raise Exception(f"ERROR: Delete failed for {repo_name}")
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from github_api import REPO_TYPES, GitHubClient, iter_org_repos, print_summary, run_on_repos  # noqa: E402
+import repo_select  # noqa: E402
+import archive  # noqa: E402
 
-
-def delete_repos(repo_names, token):
-    for repo_name in repo_names:
-        print(f"Deleting {repo_name}...")
-        delete_repo(repo_name, token)
+GITHUB_REPO_API = "/repos/{}"
+CONFIG_FILE = "config.ini"
+MAX_WORKERS = 8
 
 
-def headers(token):
-    return {
-        "Authorization": f"Bearer {token}",
-        "Accept": "application/vnd.github.inertia-preview+json",
-        "User-Agent": "repodelete",
-    }
+def get_all_repos(org, client, repo_type="all"):
+    return list(iter_org_repos(org, client, repo_type=repo_type))
 
 
-def diff_lists(list1, list2):
-    upper_list2 = [el.upper() for el in list2]
-    return [el for el in list1 if el.upper() not in upper_list2]
+def try_delete_repo(repo_name, client):
+    """
+    Deletes a single repo. Returns None on success or an error message
+    on failure instead of raising.
+    """
+    try:
+        res = client.delete(GITHUB_REPO_API.format(repo_name))
+    except requests.RequestException as e:
+        return str(e)
+    if not 200 <= res.status_code < 300:
+        try:
+            return f"{res.status_code}: {res.json().get('message', res.text)}"
+        except ValueError:
+            return f"{res.status_code}: {res.text}"
+    return None
+
+
+def delete_repos_concurrently(repo_names, client, max_workers=MAX_WORKERS):
+    """
+    Deletes repos across a pool of worker threads. The client waits out
+    rate limits, and a failed delete doesn't stop the others. Returns a
+    run_on_repos summary: {"ok": [repo_name, ...], "failed": {repo_name: error, ...}}
+    """
+    return run_on_repos(partial(try_delete_repo, client=client), repo_names, max_workers=max_workers,
+                        action="Delete", done="Deleted")
+
+
+def archive_then_delete(repo_names, client, archive_dir=archive.ARCHIVE_DIR, max_workers=MAX_WORKERS, empty=()):
+    """
+    Downloads each repo's tarball, then deletes only the repos whose
+    archive is verified on disk. Returns the delete summary.
+    arg empty: names of repos without commits
+    """
+    archive_summary = archive.archive_repos_concurrently(
+        repo_names, client, archive_dir, max_workers=max_workers, empty=empty
+    )
+    print_summary(archive_summary, f"archived to {archive_dir}")
+    if archive_summary["failed"]:
+        print("Repos that could not be archived will not be deleted.")
+    return delete_repos_concurrently(sorted(archive_summary["ok"]), client, max_workers=max_workers)
 
 
 def prompt_for_org_info():
@@ -74,27 +98,68 @@ def prompt_for_repos_to_keep():
     return repos_to_keep
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Bulk delete repos in a Github org.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=MAX_WORKERS,
+        help="Number of repos to delete at once. Use 1 to delete serially.",
+    )
+    parser.add_argument(
+        "--type",
+        dest="repo_type",
+        choices=REPO_TYPES,
+        default="all",
+        help="Only list repos of this type (filtered by Github).",
+    )
+    parser.add_argument(
+        "--archive-dir",
+        default=archive.ARCHIVE_DIR,
+        help=f"Where to download a tarball of each repo before deleting it. (default: {archive.ARCHIVE_DIR})",
+    )
+    parser.add_argument(
+        "--no-archive",
+        action="store_true",
+        help="Delete without downloading the repos first.",
+    )
+    repo_select.add_arguments(parser)
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
+    args = parse_args()
     org = prompt_for_org_info()
     token = load_token()
+    client = GitHubClient(token, user_agent="repodelete", pool_size=args.workers)
 
-    repos = get_all_repos(org, token)
-    full_names = [repo["full_name"] for repo in repos]
+    repos = get_all_repos(org, client, repo_type=args.repo_type)
+    full_names = sorted(repo["full_name"] for repo in repos)
 
     print("Found the following repos:")
     print("\n".join(full_names))
 
-    keep_names = [
-        f"{org}/{name}" if "/" not in name else name
-        for name in prompt_for_repos_to_keep()
-    ]
+    keep, only = repo_select.selection_from_args(args)
+    if keep is None:
+        keep = prompt_for_repos_to_keep()
+    if only is not None:
+        only = repo_select.qualify(only, org)
 
-    delete_names = diff_lists(full_names, keep_names)
+    delete_names, _ = repo_select.partition(
+        full_names, keep=repo_select.qualify(keep, org), only=only
+    )
 
     print("The following repos will be PERMENANTLY deleted.")
     print("\n".join(delete_names))
+    if not args.no_archive:
+        print(f"Each one is downloaded to {args.archive_dir} first, and only deleted once that worked.")
     confirm = input("Do you wish to proceed? (yes/no)")
     if confirm != "yes":
         print("...probably a wise choice.")
     else:
-        delete_repos(delete_names, token)
+        if args.no_archive:
+            summary = delete_repos_concurrently(delete_names, client, max_workers=args.workers)
+        else:
+            empty = [repo["full_name"] for repo in repos if repo.get("size") == 0]
+            summary = archive_then_delete(delete_names, client, args.archive_dir, max_workers=args.workers, empty=empty)
+        print_summary(summary, "deleted")
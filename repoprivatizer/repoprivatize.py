@@ -1,62 +1,105 @@
 #!/usr/bin/env python
 # thank you Andy
+import argparse
+import os
+import sys
+import time
+from functools import partial
+
 import requests
-import getpass
 import configparser
 import json
 
-GITHUB_GET_REPOS_API = "https://api.github.com/orgs/{}/repos"
-GITHUB_REPO_API = "https://api.github.com/repos/{}"
-CONFIG_FILE = "config.ini"
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from github_api import GitHubClient, iter_org_repos, iter_org_repos_graphql, print_summary, run_on_repos  # noqa: E402
+import repo_select  # noqa: E402
 
-def get_all_public_repos(org, token):
-    repos = []
-    params = {
-        'page': 1,
-        'per_page': 100
-    }
-    res = requests.get(GITHUB_GET_REPOS_API.format(org),
-                       headers=headers(token),
-                       params = params).json()
-    while(len(res) > 0):
-        repos.extend([repo["full_name"] for repo in res if not repo['private'] and 'github.io' not in repo['full_name']])
-        params['page'] += 1
-        res = requests.get(GITHUB_GET_REPOS_API.format(org),
-                           headers=headers(token),
-                           params = params).json()
-        
-    return repos
-
-def make_repo_private(repo_name, token):
+GITHUB_REPO_API = "/repos/{}"
+CONFIG_FILE = "config.ini"
+JOURNAL_FILE = "privatize_journal.jsonl"
+MAX_WORKERS = 8
+
+def get_all_public_repos(org, client, backend="graphql"):
+    if backend == "graphql":
+        try:
+            repos = list(iter_org_repos_graphql(org, client, privacy="PUBLIC"))
+        except Exception as e:
+            print(f"GraphQL listing failed, falling back to REST: {e}")
+            return get_all_public_repos(org, client, backend="rest")
+    else:
+        repos = iter_org_repos(org, client, repo_type="public")
+    return sorted(repo["full_name"] for repo in repos
+                  if not repo['private'] and 'github.io' not in repo['full_name'])
+
+def try_make_repo_private(repo_name, client):
+    """
+    Makes a single repo private. Returns None on success or an error
+    message on failure instead of raising.
+    """
     data = {"private": "true"}
-    
-    res = requests.patch(GITHUB_REPO_API.format(repo_name),
-                         headers=headers(token),
-                         data = json.dumps(data))
-                         
-    if res.status_code < 200 or res.status_code > 300:
-        print(f"ERROR: Patch failed for {repo_name}")
-        print(res.json())
-        raise Exception(f"ERROR: Patch failed for {repo_name}")
-
-
-def make_repos_private(repo_names, token):
-    for repo_name in repo_names:
-        print(f"Patching {repo_name}...")
-        make_repo_private(repo_name, token)
-
-
-def headers(token):
-    return {
-        "Authorization": f"Bearer {token}",
-        "Accept": "application/vnd.github.inertia-preview+json",
-        "User-Agent": "repodelete",
-    }
-
-
-def diff_lists(list1, list2):
-    upper_list2 = [el.upper() for el in list2]
-    return [el for el in list1 if el.upper() not in upper_list2]
+    try:
+        res = client.patch(GITHUB_REPO_API.format(repo_name), data=json.dumps(data))
+    except requests.RequestException as e:
+        return str(e)
+    if not 200 <= res.status_code < 300:
+        try:
+            return f"{res.status_code}: {res.json().get('message', res.text)}"
+        except ValueError:
+            return f"{res.status_code}: {res.text}"
+    return None
+
+
+def make_repos_private_concurrently(repo_names, client, journal, max_workers=MAX_WORKERS):
+    """
+    Makes repos private across a pool of worker threads, recording every
+    outcome in the journal as it happens. A failed patch doesn't stop the
+    others. Returns a run_on_repos summary:
+    {"ok": [repo_name, ...], "failed": {repo_name: error, ...}}
+    """
+    def record(repo_name, error):
+        if error is None:
+            journal.record("done", repo=repo_name)
+        else:
+            journal.record("failed", repo=repo_name, error=error)
+
+    return run_on_repos(partial(try_make_repo_private, client=client), repo_names, max_workers=max_workers,
+                        action="Patch", done="Patched", on_result=record)
+
+
+class Journal:
+    """
+    Append-only JSON lines log of a privatize run. A run starts with a
+    "plan" record listing every repo to patch, followed by one "done" or
+    "failed" record per repo, so an interrupted run can be picked up
+    with only the repos that haven't been patched yet.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def record(self, event, **fields):
+        with open(self.path, "a") as f:
+            f.write(json.dumps({"event": event, "time": time.time(), **fields}) + "\n")
+
+    def records(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path) as f:
+            # a crash mid-write can leave a partial last line
+            return [json.loads(line) for line in f if line.strip().endswith("}")]
+
+    def remaining(self):
+        """
+        Returns (org, repo_names) for the most recent plan, minus the repos
+        already patched, or (None, []) when there is no plan to resume.
+        """
+        org, planned, done = None, [], set()
+        for record in self.records():
+            if record["event"] == "plan":
+                org, planned, done = record["org"], record["repos"], set()
+            elif record["event"] == "done":
+                done.add(record["repo"])
+        return org, [repo for repo in planned if repo not in done]
 
 
 def prompt_for_org_info():
@@ -93,21 +136,71 @@ def prompt_for_repos_to_keep():
     return repos_to_keep
 
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Bulk convert repos in a Github org to private.")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=MAX_WORKERS,
+        help="Number of repos to patch at once. Use 1 to patch serially.",
+    )
+    parser.add_argument(
+        "--journal",
+        default=JOURNAL_FILE,
+        help=f"Where to record the outcome for each repo. (default: {JOURNAL_FILE})",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Pick up the last run from the journal instead of listing the org again.",
+    )
+    parser.add_argument(
+        "--backend",
+        choices=["graphql", "rest"],
+        default="graphql",
+        help="API used to list the org's public repos. (default: graphql, falls back to rest)",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="Show which repos would be made private without changing anything.",
+    )
+    repo_select.add_arguments(parser)
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    org = prompt_for_org_info()
+    args = parse_args()
+    journal = Journal(args.journal)
     token = load_token()
+    client = GitHubClient(token, user_agent="repoprivatize", pool_size=args.workers)
+
+    if args.resume:
+        org, private_names = journal.remaining()
+        if org is None:
+            sys.exit(f"ERROR: No run to resume in {args.journal}")
+        print(f"Resuming {org} from {args.journal}")
+    else:
+        org = prompt_for_org_info()
+        full_names = get_all_public_repos(org, client, backend=args.backend)
 
-    full_names = get_all_public_repos(org, token)
+        print("Found the following repos:")
+        print("\n".join(full_names))
 
-    print("Found the following repos:")
-    print("\n".join(full_names))
+        keep, only = repo_select.selection_from_args(args)
+        if keep is None:
+            keep = prompt_for_repos_to_keep()
+        if only is not None:
+            only = repo_select.qualify(only, org)
 
-    keep_names = [
-        f"{org}/{name}" if "/" not in name else name
-        for name in prompt_for_repos_to_keep()
-    ]
+        private_names, _ = repo_select.partition(
+            full_names, keep=repo_select.qualify(keep, org), only=only
+        )
 
-    private_names = diff_lists(full_names, keep_names)
+    if args.dry_run:
+        print(f"Dry run, the following {len(private_names)} repos would be made private.")
+        print("\n".join(private_names))
+        sys.exit()
 
     print("The following repos will be made private.")
     print("\n".join(private_names))
@@ -115,4 +208,9 @@ if __name__ == "__main__":
     if confirm != "yes":
         print("...probably a wise choice.")
     else:
-        make_repos_private(private_names, token)
+        if not args.resume:
+            journal.record("plan", org=org, repos=private_names)
+        summary = make_repos_private_concurrently(
+            private_names, client, journal, max_workers=args.workers
+        )
+        print_summary(summary, "made private")
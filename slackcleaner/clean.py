@@ -0,0 +1,208 @@
+#!/usr/bin/env python
+"""
+Filtered Slack clean up in two steps: index the channels once, then delete
+whatever an indexed query selects.
+
+    python clean.py index --channel '.*'
+    python clean.py delete --channel '.*general' --older-than 30d --keep-pinned --dry-run
+    python clean.py delete --channel '.*random' --has-files
+
+`index` pages through conversations.history and keeps a few fields per
+message in a MessageIndex; run again, it only fetches messages newer than
+the last run. `delete` picks messages from the index (by channel, age, user,
+files, pinned), so a --dry-run makes no API calls at all, and deleted
+messages are marked so a rerun only tries the ones left. Before deleting,
+the selected span of history is read again and the query rerun, so a
+message pinned after it was indexed is kept under --keep-pinned and a
+thread started on one goes with its replies.
+"""
+import argparse
+import logging
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from message_index import INDEX_FILE, MessageIndex
+from purge import HISTORY_PAGE_SIZE, MAX_WORKERS, TOKEN_FILE, Purger, SlackAPI, load_token, match_channels
+
+logger = logging.getLogger(__name__)
+
+AGE_UNITS = {"m": 60, "h": 60 * 60, "d": 24 * 60 * 60, "w": 7 * 24 * 60 * 60}
+
+
+def parse_age(age):
+    '''
+    Seconds in an age like 90m, 12h, 30d or 2w.
+    '''
+    match = re.fullmatch(r"(\d+(?:\.\d+)?)([mhdw])", age.strip())
+    if not match:
+        raise ValueError(f"can't read the age {age!r}, use e.g. 30d, 12h or 2w")
+    return float(match.group(1)) * AGE_UNITS[match.group(2)]
+
+
+def index_channel(api, index, channel):
+    '''
+    Pages a channel's history into the index, newest first. The first pass
+    records how far back it got after every page, so an interrupted one
+    continues from there; once it has reached the start of the channel only
+    messages newer than the newest indexed one are fetched.
+    Returns how many messages were added.
+    '''
+    state = index.channel(channel["id"]) or {"newest_ts": None, "oldest_ts": None, "complete": False}
+    if state["complete"]:
+        params = {"oldest": state["newest_ts"]} if state["newest_ts"] else {}
+    else:
+        params = {"latest": state["oldest_ts"]} if state["oldest_ts"] else {}
+
+    added, newest = 0, state["newest_ts"]
+    for body in api.pages("conversations.history", channel=channel["id"], limit=HISTORY_PAGE_SIZE, **params):
+        messages = body["messages"]
+        if not messages:
+            continue
+        index.add_messages(channel["id"], messages)
+        added += len(messages)
+        newest = max([m["ts"] for m in messages] + ([newest] if newest else []), key=float)
+
+        if not state["complete"]:
+            # an update only moves newest_ts once it's done, or an
+            # interrupted one would skip what it hadn't reached yet
+            state["newest_ts"], state["oldest_ts"] = newest, min((m["ts"] for m in messages), key=float)
+            index.set_channel(channel["id"], channel["name"], **state)
+
+    state["newest_ts"], state["complete"] = newest, True
+    index.set_channel(channel["id"], channel["name"], **state)
+    logger.info(f"#{channel['name']}: {added} new messages indexed")
+    return added
+
+
+def index_channels(api, index, channels, full=False):
+    summary = {}
+    for channel in channels:
+        if full:
+            index.forget_channel(channel["id"])
+        summary[channel["name"]] = index_channel(api, index, channel)
+    return summary
+
+
+def as_message(row):
+    '''
+    The parts of a history message Purger.delete_message uses, from an index row.
+    '''
+    return {"ts": row["ts"], "thread_ts": row["thread_ts"], "reply_count": row["reply_count"],
+            "files": [{"id": file_id} for file_id in row["file_ids"].split()]}
+
+
+def refresh_messages(api, index, rows):
+    '''
+    Pages each channel's history again over the span of the rows into the
+    index. An incremental index never sees a message changed after it was
+    indexed: a thread started on it, a pin, files. History is read 200
+    messages a call, far faster than messages can be deleted.
+    '''
+    by_channel = {}
+    for row in rows:
+        by_channel.setdefault(row["channel_id"], []).append(row["ts"])
+
+    for channel_id, ts_list in by_channel.items():
+        pages = api.pages("conversations.history", channel=channel_id, limit=HISTORY_PAGE_SIZE, inclusive="true",
+                          oldest=min(ts_list, key=float), latest=max(ts_list, key=float))
+        for body in pages:
+            index.add_messages(channel_id, body["messages"])
+
+
+def reselect(api, index, rows, **filters):
+    '''
+    Refreshes the selected rows' history and selects again with the same
+    filters, so what is deleted (and whether a message's thread replies go
+    with it) follows the messages as they are now, not as they were indexed.
+    '''
+    refresh_messages(api, index, rows)
+    return index.select(**filters)
+
+
+def delete_rows(purger, index, rows):
+    '''
+    Deletes the selected index rows a page at a time on the purger's pool,
+    marking each deleted one in the index. Returns {channel name: (deleted, failed)}.
+    '''
+    summary = {}
+    with ThreadPoolExecutor(max_workers=purger.workers) as pool:
+        for start in range(0, len(rows), HISTORY_PAGE_SIZE):
+            page = rows[start:start + HISTORY_PAGE_SIZE]
+            by_channel = {}
+            for row in page:
+                by_channel.setdefault((row["channel_id"], row["channel_name"]), []).append(row)
+
+            for (channel_id, name), channel_rows in by_channel.items():
+                results = purger.delete_each(channel_id, [as_message(row) for row in channel_rows], pool)
+                index.mark_deleted(channel_id, [row["ts"] for row, ok in zip(channel_rows, results) if ok])
+                deleted, failed = summary.get(name, (0, 0))
+                summary[name] = (deleted + sum(results), failed + len(results) - sum(results))
+            logger.info(f"{min(start + HISTORY_PAGE_SIZE, len(rows))}/{len(rows)} messages processed")
+    return summary
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Index Slack channels, then delete the messages a query selects.")
+    parser.add_argument("--token-file", default=TOKEN_FILE, help=f"JSON file with a token. (default: {TOKEN_FILE})")
+    parser.add_argument("--index", default=INDEX_FILE, help=f"SQLite message index. (default: {INDEX_FILE})")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    index_parser = subparsers.add_parser("index", help="Add new messages to the index.")
+    index_parser.add_argument("--channel", action="append", default=None,
+                              help="Regex (re.match) of channel names to index, can be repeated. (default: all)")
+    index_parser.add_argument("--full", action="store_true", help="Forget what was indexed and walk everything again.")
+
+    delete_parser = subparsers.add_parser("delete", help="Delete indexed messages.")
+    delete_parser.add_argument("--channel", action="append", default=None,
+                               help="Regex (re.match) of channel names to delete from, can be repeated.")
+    delete_parser.add_argument("--older-than", help="Only messages older than this, e.g. 30d, 12h, 2w.")
+    delete_parser.add_argument("--user", action="append", help="Only messages from this user id, can be repeated.")
+    delete_parser.add_argument("--keep-user", action="append", help="Leave this user id's messages, can be repeated.")
+    delete_parser.add_argument("--has-files", action="store_true", help="Only messages with files.")
+    delete_parser.add_argument("--keep-pinned", action="store_true", help="Leave pinned messages.")
+    delete_parser.add_argument("--keep-replies", action="store_true", help="Don't delete thread replies.")
+    delete_parser.add_argument("--keep-files", action="store_true", help="Don't delete files shared in the messages.")
+    delete_parser.add_argument("--workers", type=int, default=MAX_WORKERS,
+                               help=f"Concurrent deletes. (default: {MAX_WORKERS})")
+    delete_parser.add_argument("--dry-run", action="store_true",
+                               help="Only count what would be deleted, from the index.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    args = parse_args()
+    index = MessageIndex(args.index)
+
+    if args.command == "index":
+        api = SlackAPI(load_token(args.token_file))
+        channels = match_channels(api.channels(), args.channel or [".*"])
+        for name, added in index_channels(api, index, channels, full=args.full).items():
+            print(f"#{name}: {added} messages indexed")
+        api.close()
+
+    else:
+        filters = dict(
+            channels=args.channel,
+            before=time.time() - parse_age(args.older_than) if args.older_than else None,
+            users=args.user,
+            keep_users=args.keep_user,
+            has_files=True if args.has_files else None,
+            keep_pinned=args.keep_pinned,
+        )
+        rows = index.select(**filters)
+        for name, counts in index.summary(rows).items():
+            print(f"#{name}: {counts['messages']} messages, {counts['replies']} replies, {counts['files']} files")
+
+        if args.dry_run:
+            print(f"Dry run, {len(rows)} messages would be deleted.")
+        elif rows:
+            api = SlackAPI(load_token(args.token_file), pool_size=args.workers)
+            purger = Purger(api, workers=args.workers, replies=not args.keep_replies, files=not args.keep_files)
+            rows = reselect(api, index, rows, **filters)
+            for name, (deleted, failed) in delete_rows(purger, index, rows).items():
+                print(f"#{name}: {deleted} deleted, {failed} failed")
+            api.close()
+
+    index.close()
@@ -0,0 +1,170 @@
+"""
+SQLite index of the messages in a Slack workspace's channels.
+
+Only what deleting needs is kept: ts, user, thread, reply count, file ids and
+whether the message is pinned. Which messages to delete is then an ordinary
+query over the index, so previews and reruns don't call the API. Each
+channel remembers the newest message indexed (and, until the first pass
+reaches the start of the channel, the oldest), so indexing again only pages
+through what is new.
+"""
+import re
+import sqlite3
+
+INDEX_FILE = "slack_index.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS channels (
+    id TEXT PRIMARY KEY,
+    name TEXT NOT NULL,
+    newest_ts TEXT,
+    oldest_ts TEXT,
+    complete INTEGER NOT NULL DEFAULT 0
+);
+CREATE TABLE IF NOT EXISTS messages (
+    channel_id TEXT NOT NULL,
+    ts TEXT NOT NULL,
+    user TEXT,
+    thread_ts TEXT,
+    reply_count INTEGER NOT NULL DEFAULT 0,
+    file_ids TEXT NOT NULL DEFAULT '',
+    pinned INTEGER NOT NULL DEFAULT 0,
+    subtype TEXT,
+    deleted INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (channel_id, ts)
+);
+CREATE INDEX IF NOT EXISTS messages_live ON messages (deleted, channel_id, ts);
+"""
+
+
+def message_row(channel_id, msg):
+    return (
+        channel_id,
+        msg["ts"],
+        msg.get("user") or msg.get("bot_id"),
+        msg.get("thread_ts"),
+        msg.get("reply_count", 0),
+        " ".join(f["id"] for f in msg.get("files", [])),
+        int(bool(msg.get("pinned_to"))),
+        msg.get("subtype"),
+    )
+
+
+def _regexp(pattern, value):
+    return value is not None and re.match(pattern, value) is not None
+
+
+class MessageIndex:
+
+    def __init__(self, path=INDEX_FILE):
+        self.path = path
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.create_function("REGEXP", 2, _regexp)
+        self.conn.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.close()
+
+    def channel(self, channel_id):
+        '''
+        Returns {newest_ts, oldest_ts, complete} of a channel, or None if it was never indexed.
+        '''
+        row = self.conn.execute(
+            "SELECT newest_ts, oldest_ts, complete FROM channels WHERE id = ?", (channel_id,)
+        ).fetchone()
+        return dict(row) if row else None
+
+    def set_channel(self, channel_id, name, newest_ts=None, oldest_ts=None, complete=False):
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO channels VALUES (?, ?, ?, ?, ?)",
+                (channel_id, name, newest_ts, oldest_ts, int(complete)),
+            )
+
+    def forget_channel(self, channel_id):
+        '''
+        Drops a channel's messages and progress so the next index walks it all again.
+        '''
+        with self.conn:
+            self.conn.execute("DELETE FROM messages WHERE channel_id = ?", (channel_id,))
+            self.conn.execute("DELETE FROM channels WHERE id = ?", (channel_id,))
+
+    def add_messages(self, channel_id, messages):
+        '''
+        Adds messages from conversations.history. A message seen again is
+        replaced, so it counts as not deleted.
+        '''
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO messages VALUES (?, ?, ?, ?, ?, ?, ?, ?, 0)",
+                [message_row(channel_id, msg) for msg in messages],
+            )
+
+    def mark_deleted(self, channel_id, ts_list):
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE messages SET deleted = 1 WHERE channel_id = ? AND ts = ?",
+                [(channel_id, ts) for ts in ts_list],
+            )
+
+    def select(self, channels=None, before=None, users=None, keep_users=None, has_files=None,
+               keep_pinned=False, include_deleted=False):
+        '''
+        Indexed messages matching all of the given filters, oldest last per
+        channel, as dicts with the channel's name:
+         - channels: regexes (re.match) of channel names
+         - before: only messages older than this unix time
+         - users / keep_users: only / all but these user ids
+         - has_files: only messages with (True) or without (False) files
+         - keep_pinned: leave out pinned messages
+        '''
+        conditions, params = [], []
+        if not include_deleted:
+            conditions.append("m.deleted = 0")
+        if channels:
+            conditions.append("(" + " OR ".join("c.name REGEXP ?" for _ in channels) + ")")
+            params.extend(channels)
+        if before is not None:
+            conditions.append("CAST(m.ts AS REAL) < ?")
+            params.append(before)
+        if users:
+            conditions.append(f"m.user IN ({','.join('?' * len(users))})")
+            params.extend(users)
+        if keep_users:
+            conditions.append(f"(m.user IS NULL OR m.user NOT IN ({','.join('?' * len(keep_users))}))")
+            params.extend(keep_users)
+        if has_files is not None:
+            conditions.append("m.file_ids != ''" if has_files else "m.file_ids = ''")
+        if keep_pinned:
+            conditions.append("m.pinned = 0")
+
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self.conn.execute(
+            f"""
+            SELECT m.*, c.name AS channel_name
+            FROM messages m JOIN channels c ON c.id = m.channel_id
+            {where}
+            ORDER BY c.name, m.ts DESC
+            """,
+            params,
+        )
+        return [dict(row) for row in rows]
+
+    def summary(self, rows):
+        '''
+        Messages, thread replies and files per channel in some selected rows.
+        '''
+        counts = {}
+        for row in rows:
+            channel = counts.setdefault(row["channel_name"], {"messages": 0, "replies": 0, "files": 0})
+            channel["messages"] += 1
+            channel["replies"] += row["reply_count"]
+            channel["files"] += len(row["file_ids"].split())
+        return counts
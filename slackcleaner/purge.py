@@ -0,0 +1,362 @@
+#!/usr/bin/env python
+"""
+Deletes every message (with its thread replies and files) from Slack channels.
+
+Deletes run on a pool of worker threads, but every call goes through a rate
+limiter that knows Slack's per method tiers, so the pool runs as fast as
+Slack allows without being throttled. Progress is checkpointed per channel
+after each page of history, so an interrupted purge picks up where it
+stopped instead of listing everything again.
+
+    python purge.py --channel '.*general' --channel '.*random'
+    python purge.py --channel '.*nss-data-analytics-js' --token-file token.json --workers 8
+
+Set SLACK_API_URL (or pass api_url) to point it at a local fake Slack.
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# overridable so the purge can be run against a local fake Slack API
+SLACK_API = os.environ.get("SLACK_API_URL", "https://slack.com/api/")
+TOKEN_FILE = "token.json"
+CHECKPOINT_FILE = "purge_checkpoint.json"
+MAX_WORKERS = 8
+MAX_RETRIES = 5
+# seconds, doubled on each retry of a 5xx or a connection error
+BACKOFF = 1.0
+# seconds to connect and to wait for each read of the response
+TIMEOUT = (10, 60)
+HISTORY_PAGE_SIZE = 200
+
+# calls per minute of each tier, https://api.slack.com/docs/rate-limits
+TIER_PER_MINUTE = {1: 1, 2: 20, 3: 50, 4: 100}
+METHOD_TIERS = {
+    "auth.test": 4,
+    "conversations.list": 2,
+    "conversations.history": 3,
+    "conversations.replies": 3,
+    "chat.delete": 3,
+    "files.delete": 3,
+}
+DEFAULT_TIER = 2
+# errors that mean the thing is already gone
+GONE_ERRORS = {"message_not_found", "file_not_found", "file_deleted", "thread_not_found"}
+
+
+class SlackError(Exception):
+    def __init__(self, method, error):
+        super().__init__(f"{method}: {error}")
+        self.method = method
+        self.error = error
+
+
+class RateLimiter:
+    """
+    Token bucket per API method, sized from the method's tier. Slack counts
+    limits per method, so a busy chat.delete doesn't hold up files.delete.
+    A 429's Retry-After pauses that method for every thread.
+    """
+
+    def __init__(self, tiers=METHOD_TIERS, per_minute=TIER_PER_MINUTE):
+        self.tiers = tiers
+        self.per_minute = per_minute
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, method):
+        if method not in self._buckets:
+            rate = self.per_minute[self.tiers.get(method, DEFAULT_TIER)] / 60
+            # a small burst, as the tiers allow, then one call every 1/rate seconds
+            capacity = max(1.0, rate * 5)
+            self._buckets[method] = {"rate": rate, "capacity": capacity, "tokens": capacity,
+                                     "updated": time.monotonic(), "resume_at": 0.0}
+        return self._buckets[method]
+
+    def acquire(self, method):
+        while True:
+            with self._lock:
+                bucket = self._bucket(method)
+                now = time.monotonic()
+                bucket["tokens"] = min(bucket["capacity"], bucket["tokens"] + (now - bucket["updated"]) * bucket["rate"])
+                bucket["updated"] = now
+                if now >= bucket["resume_at"] and bucket["tokens"] >= 1:
+                    bucket["tokens"] -= 1
+                    return
+                delay = max(bucket["resume_at"] - now, (1 - bucket["tokens"]) / bucket["rate"])
+            time.sleep(delay)
+
+    def pause(self, method, seconds):
+        with self._lock:
+            bucket = self._bucket(method)
+            bucket["resume_at"] = max(bucket["resume_at"], time.monotonic() + seconds)
+            bucket["tokens"] = 0.0
+
+
+class SlackAPI:
+    """
+    Minimal Slack Web API client on a pooled requests.Session, rate limited
+    per method. 429s are retried after their Retry-After, 5xx responses,
+    connection errors and timeouts with jittered exponential backoff.
+    """
+
+    def __init__(self, token, api_url=None, pool_size=MAX_WORKERS, limiter=None, max_retries=MAX_RETRIES,
+                 backoff=BACKOFF, timeout=TIMEOUT):
+        self.api_url = api_url or SLACK_API
+        self.limiter = limiter or RateLimiter()
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {token}"
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+    def close(self):
+        self.session.close()
+
+    def call(self, method, **params):
+        '''
+        Calls a method and returns its body, raising SlackError when it isn't
+        ok, or the last HTTP or connection error once the retries run out.
+        '''
+        url = self.api_url.rstrip("/") + "/" + method
+        for attempt in range(self.max_retries + 1):
+            self.limiter.acquire(method)
+            last_attempt = attempt == self.max_retries
+            try:
+                res = self.session.post(url, data=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if last_attempt:
+                    raise
+                logger.info(f"{method} failed ({e}), retrying")
+                self._sleep(attempt)
+                continue
+            if res.status_code == 429 and not last_attempt:
+                retry_after = float(res.headers.get("Retry-After", 1))
+                logger.info(f"{method} rate limited, retrying in {retry_after}s")
+                self.limiter.pause(method, retry_after)
+                continue
+            if res.status_code >= 500 and not last_attempt:
+                logger.info(f"{method} got a {res.status_code}, retrying")
+                self._sleep(attempt)
+                continue
+            res.raise_for_status()
+            body = res.json()
+            if not body.get("ok"):
+                raise SlackError(method, body.get("error", "unknown_error"))
+            return body
+
+    def _sleep(self, attempt):
+        delay = self.backoff * 2 ** attempt
+        time.sleep(delay + random.uniform(0, delay))
+
+    def pages(self, method, **params):
+        '''
+        Calls a cursor paginated method until the last page, yielding each body.
+        '''
+        cursor = None
+        while True:
+            body = self.call(method, **params, **({"cursor": cursor} if cursor else {}))
+            yield body
+            cursor = body.get("response_metadata", {}).get("next_cursor")
+            if not cursor:
+                return
+
+    def channels(self, types="public_channel,private_channel"):
+        for body in self.pages("conversations.list", types=types, limit=200, exclude_archived=False):
+            yield from body["channels"]
+
+
+def match_channels(channels, patterns):
+    '''
+    Channels whose name matches (re.match) any of the patterns, like
+    slack_cleaner2's match('.*general').
+    '''
+    patterns = [re.compile(p) for p in patterns]
+    return [c for c in channels if any(p.match(c["name"]) for p in patterns)]
+
+
+class Checkpoint:
+    """
+    JSON file of the progress of unfinished purges per channel id: the ts
+    of the oldest message whose page is fully processed and counts so far.
+    Everything newer than "latest" has been dealt with, so a resumed purge
+    asks history for older messages only. A channel's entry is dropped once
+    its purge finishes, so the next purge of it starts from the top.
+    """
+
+    def __init__(self, path=CHECKPOINT_FILE):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path) as f:
+                self.channels = json.load(f)
+        except (OSError, ValueError):
+            self.channels = {}
+
+    def get(self, channel_id):
+        return self.channels.get(channel_id, {"latest": None, "deleted": 0, "failed": 0})
+
+    def _save(self):
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.channels, f, indent=1)
+        os.replace(tmp_path, self.path)
+
+    def update(self, channel_id, **fields):
+        with self._lock:
+            self.channels[channel_id] = dict(self.get(channel_id), **fields)
+            self._save()
+
+    def reset(self, channel_id):
+        with self._lock:
+            if self.channels.pop(channel_id, None) is not None:
+                self._save()
+
+
+class Purger:
+    """
+    Deletes messages on a pool of `workers` threads through a SlackAPI.
+    Each message's thread replies and files go first, then the message.
+    """
+
+    def __init__(self, api, checkpoint=None, workers=MAX_WORKERS, replies=True, files=True):
+        self.api = api
+        self.checkpoint = checkpoint or Checkpoint()
+        self.workers = workers
+        self.replies = replies
+        self.files = files
+
+    def delete(self, method, **params):
+        '''
+        True once the thing is gone, False when Slack won't delete it or
+        still fails after the retries, so one message can't stop the purge.
+        '''
+        try:
+            self.api.call(method, **params)
+        except SlackError as e:
+            if e.error in GONE_ERRORS:
+                return True
+            logger.warning(f"could not {method} {params}: {e.error}")
+            return False
+        except requests.RequestException as e:
+            logger.warning(f"could not {method} {params}: {e}")
+            return False
+        return True
+
+    def delete_files(self, msg):
+        return all([self.delete("files.delete", file=f["id"]) for f in msg.get("files", [])])
+
+    def delete_message(self, channel_id, msg):
+        '''
+        Deletes a message with its replies and files. Returns whether all of
+        it is gone.
+        '''
+        ok = True
+        # thread parents have thread_ts == ts
+        if self.replies and (msg.get("reply_count") or msg.get("thread_ts") == msg["ts"]):
+            for body in self.api.pages("conversations.replies", channel=channel_id, ts=msg["ts"], limit=200):
+                for reply in body["messages"]:
+                    if reply["ts"] == msg["ts"]:
+                        continue
+                    if self.files:
+                        ok &= self.delete_files(reply)
+                    ok &= self.delete("chat.delete", channel=channel_id, ts=reply["ts"])
+        if self.files:
+            ok &= self.delete_files(msg)
+        ok &= self.delete("chat.delete", channel=channel_id, ts=msg["ts"])
+        return ok
+
+    def delete_each(self, channel_id, messages, pool):
+        '''
+        Deletes messages on the pool, returning whether each one is gone.
+        '''
+        return list(pool.map(lambda msg: self.delete_message(channel_id, msg), messages))
+
+    def delete_messages(self, channel_id, messages, pool):
+        '''
+        Deletes messages on the pool, returning (deleted, failed) counts.
+        '''
+        results = self.delete_each(channel_id, messages, pool)
+        return sum(results), len(results) - sum(results)
+
+    def purge_channel(self, channel, pool):
+        channel_id = channel["id"]
+        progress = self.checkpoint.get(channel_id)
+        logger.info(f"purging #{channel['name']}" + (f" from {progress['latest']}" if progress["latest"] else ""))
+        params = {"latest": progress["latest"]} if progress["latest"] else {}
+        for body in self.api.pages("conversations.history", channel=channel_id, limit=HISTORY_PAGE_SIZE, **params):
+            messages = body["messages"]
+            if not messages:
+                continue
+            deleted, failed = self.delete_messages(channel_id, messages, pool)
+            progress = dict(progress, latest=min(m["ts"] for m in messages),
+                            deleted=progress["deleted"] + deleted, failed=progress["failed"] + failed)
+            self.checkpoint.update(channel_id, **progress)
+            logger.info(f"#{channel['name']}: {progress['deleted']} deleted, {progress['failed']} failed")
+
+        self.checkpoint.reset(channel_id)
+        return progress
+
+    def purge(self, channels, restart=False):
+        '''
+        Purges the channels one after the other (messages within a channel
+        are deleted concurrently). Returns {channel name: progress}.
+        '''
+        summary = {}
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            for channel in channels:
+                if restart:
+                    self.checkpoint.reset(channel["id"])
+                summary[channel["name"]] = self.purge_channel(channel, pool)
+        return summary
+
+
+def load_token(path=TOKEN_FILE):
+    with open(path) as f:
+        return json.load(f)["token"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Delete every message in Slack channels.")
+    parser.add_argument("--channel", action="append", required=True,
+                        help="Regex (re.match) of channel names to purge, can be repeated.")
+    parser.add_argument("--token-file", default=TOKEN_FILE, help=f"JSON file with a token. (default: {TOKEN_FILE})")
+    parser.add_argument("--checkpoint", default=CHECKPOINT_FILE,
+                        help=f"Where progress is kept for resuming. (default: {CHECKPOINT_FILE})")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS,
+                        help=f"Concurrent deletes. (default: {MAX_WORKERS})")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start the channels over.")
+    parser.add_argument("--keep-replies", action="store_true", help="Don't delete thread replies.")
+    parser.add_argument("--keep-files", action="store_true", help="Don't delete files shared in the messages.")
+    parser.add_argument("--dry-run", action="store_true", help="Only list the channels that would be purged.")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    args = parse_args()
+    api = SlackAPI(load_token(args.token_file), pool_size=args.workers)
+    channels = match_channels(api.channels(), args.channel)
+    print("Channels to purge: " + ", ".join("#" + c["name"] for c in channels))
+
+    if not args.dry_run:
+        purger = Purger(api, Checkpoint(args.checkpoint), workers=args.workers,
+                        replies=not args.keep_replies, files=not args.keep_files)
+        for name, progress in purger.purge(channels, restart=args.restart).items():
+            print(f"#{name}: {progress['deleted']} deleted, {progress['failed']} failed")
+    api.close()
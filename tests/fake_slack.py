@@ -0,0 +1,174 @@
+"""
+Local fake of the Slack Web API methods slackcleaner uses, served over HTTP
+so SlackAPI talks to it exactly as it would to Slack.
+
+    fake = FakeSlack()
+    fake.add_message("C1", "1600000001.000100", pinned=True)
+    with serve(fake) as url:
+        api = SlackAPI("token", api_url=url)
+
+Methods can be made to fail a few times first with fake.fail(method, ...),
+e.g. fake.fail("chat.delete", 429, 500, "drop").
+"""
+import json
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+
+
+class FakeSlack:
+
+    def __init__(self):
+        self.channels = {}
+        self.messages = {}
+        self.replies = {}
+        self.files = set()
+        self.calls = {}
+        self.undeletable = set()
+        self._failures = {}
+        self._lock = threading.Lock()
+
+    def add_channel(self, channel_id, name):
+        self.channels[channel_id] = name
+        self.messages.setdefault(channel_id, {})
+
+    def add_message(self, channel_id, ts, user="U1", files=(), pinned=False):
+        if channel_id not in self.channels:
+            self.add_channel(channel_id, channel_id.lower())
+        msg = {"ts": ts, "user": user, "text": "hi"}
+        if files:
+            msg["files"] = [{"id": file_id} for file_id in files]
+            self.files.update(files)
+        if pinned:
+            msg["pinned_to"] = [channel_id]
+        self.messages[channel_id][ts] = msg
+        return msg
+
+    def add_reply(self, channel_id, parent_ts, ts, user="U2"):
+        parent = self.messages[channel_id][parent_ts]
+        parent["thread_ts"] = parent_ts
+        parent["reply_count"] = parent.get("reply_count", 0) + 1
+        self.replies.setdefault(parent_ts, {})[ts] = {"ts": ts, "user": user, "thread_ts": parent_ts}
+
+    def pin(self, channel_id, ts):
+        self.messages[channel_id][ts]["pinned_to"] = [channel_id]
+
+    def fail(self, method, *failures):
+        '''
+        The next calls of method answer with these, in order: a status code
+        (429 comes with a Retry-After) or "drop" to close the connection.
+        '''
+        self._failures.setdefault(method, []).extend(failures)
+
+    def live_messages(self, channel_id):
+        return sorted(self.messages[channel_id])
+
+    def live_replies(self):
+        return sorted(ts for replies in self.replies.values() for ts in replies)
+
+    def next_failure(self, method):
+        with self._lock:
+            self.calls[method] = self.calls.get(method, 0) + 1
+            failures = self._failures.get(method)
+            return failures.pop(0) if failures else None
+
+    def call(self, method, params):
+        with self._lock:
+            handler = getattr(self, "_" + method.replace(".", "_"), None)
+            if handler is None:
+                return {"ok": False, "error": "unknown_method"}
+            return handler(params)
+
+    def _conversations_list(self, params):
+        return {"ok": True, "channels": [{"id": channel_id, "name": name} for channel_id, name in self.channels.items()],
+                "response_metadata": {"next_cursor": ""}}
+
+    def _conversations_history(self, params):
+        inclusive = params.get("inclusive") == "true"
+        # the cursor is the ts of the last message of the previous page
+        latest, oldest = params.get("cursor") or params.get("latest"), params.get("oldest")
+        messages = sorted(self.messages[params["channel"]].values(), key=lambda m: -float(m["ts"]))
+        if latest:
+            messages = [m for m in messages if float(m["ts"]) < float(latest)
+                        or (inclusive and not params.get("cursor") and m["ts"] == latest)]
+        if oldest:
+            messages = [m for m in messages if float(m["ts"]) > float(oldest) or (inclusive and m["ts"] == oldest)]
+        limit = int(params.get("limit", 100))
+        page = messages[:limit]
+        cursor = page[-1]["ts"] if len(messages) > limit else ""
+        return {"ok": True, "messages": [dict(m) for m in page], "has_more": bool(cursor),
+                "response_metadata": {"next_cursor": cursor}}
+
+    def _conversations_replies(self, params):
+        parent = self.messages[params["channel"]].get(params["ts"])
+        if parent is None:
+            return {"ok": False, "error": "thread_not_found"}
+        replies = sorted(self.replies.get(params["ts"], {}).values(), key=lambda m: float(m["ts"]))
+        return {"ok": True, "messages": [dict(parent)] + [dict(m) for m in replies],
+                "response_metadata": {"next_cursor": ""}}
+
+    def _chat_delete(self, params):
+        channel, ts = params["channel"], params["ts"]
+        if ts in self.undeletable:
+            return {"ok": False, "error": "cant_delete_message"}
+        if self.messages[channel].pop(ts, None) is not None:
+            return {"ok": True}
+        for replies in self.replies.values():
+            if replies.pop(ts, None) is not None:
+                return {"ok": True}
+        return {"ok": False, "error": "message_not_found"}
+
+    def _files_delete(self, params):
+        if params["file"] in self.files:
+            self.files.discard(params["file"])
+            return {"ok": True}
+        return {"ok": False, "error": "file_not_found"}
+
+
+class FakeSlackHandler(BaseHTTPRequestHandler):
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode()
+        params = {k: v[0] for k, v in parse_qs(body).items()}
+        method = self.path.rstrip("/").split("/")[-1]
+        fake = self.server.fake
+
+        failure = fake.next_failure(method)
+        if failure == "drop":
+            self.close_connection = True
+            self.connection.shutdown(2)
+            return
+        if failure is not None:
+            self.reply(failure, {"ok": False, "error": "ratelimited" if failure == 429 else "internal_error"})
+            return
+        self.reply(200, fake.call(method, params))
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        if status == 429:
+            self.send_header("Retry-After", "0")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def serve(fake):
+    '''
+    Serves the fake on a free local port, yielding the api_url to give SlackAPI.
+    '''
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FakeSlackHandler)
+    server.daemon_threads = True
+    server.fake = fake
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/api/"
+    finally:
+        server.shutdown()
+        server.server_close()
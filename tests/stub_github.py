@@ -0,0 +1,79 @@
+"""
+Local stub of the Github REST API for the repo tools' tests. Each
+(method, path) answers with a scripted list of responses, the last one
+repeating, and every request is logged.
+
+    stub = StubGitHub()
+    stub.route("DELETE", "/repos/org/a", (429, {"Retry-After": "0"}, b""), (204, {}, b""))
+    with serve(stub) as url, monkeypatch.context() as m:
+        m.setattr(github_api, "GITHUB_API", url)
+"""
+import threading
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class StubGitHub:
+
+    def __init__(self):
+        self.routes = {}
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def route(self, method, path, *responses):
+        '''
+        responses are (status, headers, body bytes), or a callable taking the
+        handler for anything more (like closing the connection midway)
+        '''
+        self.routes[method, path] = list(responses)
+
+    def count(self, method, path):
+        return self.requests.count((method, path))
+
+    def next_response(self, method, path):
+        with self._lock:
+            self.requests.append((method, path))
+            responses = self.routes.get((method, path))
+            if not responses:
+                return 404, {}, b'{"message": "Not Found"}'
+            return responses.pop(0) if len(responses) > 1 else responses[0]
+
+
+class StubGitHubHandler(BaseHTTPRequestHandler):
+
+    def handle_one(self):
+        if "Content-Length" in self.headers:
+            self.rfile.read(int(self.headers["Content-Length"]))
+        response = self.server.stub.next_response(self.command, self.path.split("?")[0])
+        if callable(response):
+            response(self)
+            return
+        status, headers, body = response
+        self.send_response(status)
+        for name, value in headers.items():
+            self.send_header(name, value)
+        if "Content-Length" not in headers:
+            self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    do_GET = do_DELETE = do_PATCH = do_POST = handle_one
+
+    def log_message(self, *args):
+        pass
+
+
+@contextmanager
+def serve(stub):
+    '''
+    Serves the stub on a free local port, yielding its base url.
+    '''
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubGitHubHandler)
+    server.daemon_threads = True
+    server.stub = stub
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
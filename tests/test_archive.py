@@ -0,0 +1,90 @@
+"""
+repodelete's archive-then-delete against a local stub of the Github API:
+only repos whose tarball is verified on disk are ever deleted.
+"""
+import gzip
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "repodelete"))
+import github_api  # noqa: E402
+from archive import archive_path, archive_repos_concurrently, is_archived  # noqa: E402
+from github_api import GitHubClient  # noqa: E402
+from repodelete import archive_then_delete  # noqa: E402
+
+from stub_github import StubGitHub, serve  # noqa: E402
+
+TARBALL = gzip.compress(os.urandom(200_000))
+GZIP = {"Content-Type": "application/x-gzip"}
+REPOS = ["org/good", "org/redirected", "org/truncated", "org/corrupt", "org/error", "org/empty"]
+
+
+def cut_off(handler):
+    '''
+    promises the whole tarball, sends half of it and hangs up
+    '''
+    handler.send_response(200)
+    handler.send_header("Content-Length", str(len(TARBALL)))
+    handler.end_headers()
+    handler.wfile.write(TARBALL[:len(TARBALL) // 2])
+    handler.wfile.flush()
+    handler.close_connection = True
+    handler.connection.shutdown(2)
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    stub = StubGitHub()
+    stub.route("GET", "/repos/org/good/tarball", (200, GZIP, TARBALL))
+    stub.route("GET", "/repos/org/redirected/tarball", (302, {"Location": "/codeload/org/redirected"}, b""))
+    stub.route("GET", "/codeload/org/redirected", (200, GZIP, TARBALL))
+    stub.route("GET", "/repos/org/truncated/tarball", cut_off)
+    # the right length, but the gzip stream stops short
+    stub.route("GET", "/repos/org/corrupt/tarball", (200, GZIP, TARBALL[:-100]))
+    stub.route("GET", "/repos/org/error/tarball", (500, {}, b"oops"))
+    stub.route("GET", "/repos/org/empty/tarball", (404, {}, b'{"message": "Not Found"}'))
+    for repo in REPOS:
+        stub.route("DELETE", f"/repos/{repo}", (204, {}, b""))
+    with serve(stub) as url:
+        monkeypatch.setattr(github_api, "GITHUB_API", url)
+        yield stub
+
+
+def client():
+    return GitHubClient("token", cache_dir=None, backoff=0.01, max_retries=1)
+
+
+def test_only_verified_archives_are_archived(stub, tmp_path):
+    summary = archive_repos_concurrently(REPOS, client(), str(tmp_path), empty=["org/empty"])
+
+    assert sorted(summary["ok"]) == ["org/empty", "org/good", "org/redirected"]
+    assert sorted(summary["failed"]) == ["org/corrupt", "org/error", "org/truncated"]
+    assert summary["failed"]["org/error"].startswith("500")
+    for repo in ["org/good", "org/redirected"]:
+        path = archive_path(str(tmp_path), repo)
+        assert is_archived(path) and open(path, "rb").read() == TARBALL
+    # nothing half written is taken for an archive
+    assert not os.path.exists(archive_path(str(tmp_path), "org/truncated"))
+    assert not os.path.exists(archive_path(str(tmp_path), "org/corrupt"))
+    assert json.load(open(archive_path(str(tmp_path), "org/empty") + ".json"))["empty"]
+
+
+def test_repos_that_failed_to_archive_are_never_deleted(stub, tmp_path):
+    summary = archive_then_delete(REPOS, client(), str(tmp_path), empty=["org/empty"])
+
+    assert sorted(summary["ok"]) == ["org/empty", "org/good", "org/redirected"]
+    assert summary["failed"] == {}
+    deleted = sorted(path for method, path in stub.requests if method == "DELETE")
+    assert deleted == ["/repos/org/empty", "/repos/org/good", "/repos/org/redirected"]
+
+
+def test_archived_repos_are_not_downloaded_again(stub, tmp_path):
+    archive_repos_concurrently(["org/good"], client(), str(tmp_path))
+    archive_repos_concurrently(["org/good"], client(), str(tmp_path))
+
+    assert stub.count("GET", "/repos/org/good/tarball") == 1
@@ -0,0 +1,34 @@
+"""
+cohort.json of a small site, byte for byte against the output of the row by
+row make_cohort_dict it replaced: curly quotes, URLs without www/https,
+missing values, a non-string column, a Name column split into First and
+Last, and the image/resume files found by First or First+Last.
+"""
+import os
+import shutil
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from class_website import make_cohort_json  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "cohort")
+REPO = "nss-cohort.github.io"
+
+
+@pytest.mark.parametrize("cohort, names_to_use", [
+    # First and Last columns, files named first_last
+    ("cohort_a", ["First", "Last"]),
+    # a Name column, numbers for taglines, files named by first name
+    ("cohort_b", "First"),
+])
+def test_cohort_json_matches_golden_file(tmp_path, cohort, names_to_use):
+    repo = tmp_path / REPO
+    shutil.copytree(os.path.join(FIXTURES, REPO), repo)
+
+    outpath = make_cohort_json(str(repo / cohort / "cohort.csv"), names_to_use)
+
+    with open(outpath, "rb") as f, open(os.path.join(FIXTURES, cohort + ".json"), "rb") as golden:
+        assert f.read() == golden.read()
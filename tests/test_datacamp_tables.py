@@ -0,0 +1,154 @@
+"""
+The HTTP backend reads the tables out of the page source with lxml, the
+Selenium backend out of the rendered .table-component's innerHTML. Replayed
+from saved pages, both must clean up into the same DataFrames.
+"""
+import os
+import sys
+import threading
+
+import lxml.html
+import pandas as pd
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "datacamp-reporting"))
+from dc import tables  # noqa: E402
+from dc.http_backend import TABLE_COMPONENT_XPATH, DataCampHTTP  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "datacamp")
+ORG = "nss-data-analytics"
+PAGES = {
+    f"/enterprise/{ORG}/assignments": "assignments.html",
+    f"/enterprise/{ORG}/assignments/1021": "assignment_1021.html",
+    f"/enterprise/{ORG}/assignments/1034": "assignment_1034.html",
+    f"/enterprise/{ORG}/assignments/1040": "assignment_1040.html",
+    f"/enterprise/{ORG}/reporting": "reporting.html",
+}
+ASSIGNMENTS = ["Introduction to Python", "Data Manipulation with pandas", "Joining Data with pandas"]
+
+
+def load_page(name):
+    with open(os.path.join(FIXTURES, name), "rb") as f:
+        return f.read()
+
+
+def inner_html(content):
+    """
+    What the browser hands Selenium for table_parent.get_attribute('innerHTML'):
+    the component's children, without the component itself.
+    """
+    component = lxml.html.fromstring(content).xpath(TABLE_COMPONENT_XPATH)[0]
+    return (component.text or "") + "".join(lxml.html.tostring(child, encoding="unicode") for child in component)
+
+
+class FixtureResponse:
+
+    def __init__(self, url, content):
+        self.url = url
+        self.content = content
+
+    def raise_for_status(self):
+        pass
+
+
+class FixtureSession:
+    """
+    Serves the saved pages, keeping a log of the gets and parses in order.
+    """
+
+    def __init__(self):
+        self.log = []
+        self._lock = threading.Lock()
+
+    def get(self, url, timeout=None):
+        path = url[len(DataCampHTTP.BASE_URL):]
+        with self._lock:
+            self.log.append(("get", path))
+        return FixtureResponse(url, load_page(PAGES[path]))
+
+    def close(self):
+        pass
+
+
+class FixtureBackend(DataCampHTTP):
+
+    def __init__(self):
+        super().__init__(secrets=None, org_name=ORG, session=FixtureSession())
+        self._logged_in = True
+
+    def _table_component_df(self, page):
+        with self._session._lock:
+            self._session.log.append(("parse", page.base_url[len(self.BASE_URL):]))
+        return super()._table_component_df(page)
+
+
+def browser_df(page_name):
+    return tables.first_table_df(inner_html(load_page(page_name)))
+
+
+def test_org_summary_matches_browser():
+    expected = tables.clean_org_summary_df(browser_df("assignments.html"))
+
+    pd.testing.assert_frame_equal(FixtureBackend().get_org_summary_df(), expected)
+    assert list(expected["assignment_name"]) == ASSIGNMENTS[::-1]
+    assert expected["num_completed"].sum() == 33
+
+
+def test_assignment_summary_matches_browser():
+    backend = FixtureBackend()
+    for name, page_name in zip(ASSIGNMENTS, ["assignment_1021.html", "assignment_1034.html", "assignment_1040.html"]):
+        expected = tables.clean_assignment_summary_df(browser_df(page_name))
+        pd.testing.assert_frame_equal(backend.get_assignment_summary_df_by_name(name), expected)
+
+    assert list(expected["email"]) == ["ada@example.com", "grace@example.com"]
+
+
+def test_student_report_matches_browser():
+    expected = tables.clean_student_report_df(browser_df("reporting.html"))
+
+    pd.testing.assert_frame_equal(FixtureBackend().get_student_assignment_report(), expected)
+    assert expected["xp"].sum() == 44350
+
+
+def test_assignment_urls_from_links_and_data_href():
+    backend = FixtureBackend()
+    backend._get_assignments_page()
+
+    assert {name: url[len(backend.BASE_URL):] for name, url in backend._assignment_urls.items()} == {
+        "Introduction to Python": f"/enterprise/{ORG}/assignments/1021",
+        "Data Manipulation with pandas": f"/enterprise/{ORG}/assignments/1034",
+        "Joining Data with pandas": f"/enterprise/{ORG}/assignments/1040",
+    }
+
+
+@pytest.mark.parametrize("prefetch", [True, False])
+def test_assignment_summary_dfs_fetch_one_page_ahead(prefetch):
+    backend = FixtureBackend()
+    df = backend.get_assignment_summary_dfs(prefetch=prefetch)
+
+    expected = tables.concat_assignment_dfs([
+        tables.clean_assignment_summary_df(browser_df(page_name)).assign(assignment=name)
+        for name, page_name in zip(ASSIGNMENTS, ["assignment_1021.html", "assignment_1034.html",
+                                                 "assignment_1040.html"])
+    ])
+    pd.testing.assert_frame_equal(df, expected)
+
+    log = backend._session.log
+    detail_gets = [path for action, path in log if action == "get" and path != f"/enterprise/{ORG}/assignments"]
+    assert detail_gets == [f"/enterprise/{ORG}/assignments/{n}" for n in (1021, 1034, 1040)]
+    # when each detail page is parsed, at most the one after it has been requested
+    for parsed, (action, path) in enumerate(entry for entry in log if entry[1] in detail_gets and entry[0] == "parse"):
+        gets_so_far = [entry for entry in log[:log.index((action, path))]
+                       if entry[0] == "get" and entry[1] in detail_gets]
+        assert len(gets_so_far) <= parsed + 2
+
+
+def test_fall_back_hour_keeps_its_timezone():
+    df = FixtureBackend().get_assignment_summary_df_by_name("Data Manipulation with pandas")
+
+    # both read 01:20 on the wall, the CST one an hour after the CDT one
+    cdt, cst = df["date_completed"].iloc[:2]
+    assert cst - cdt == pd.Timedelta(hours=1)
+    assert cdt == pd.Timestamp("2020-11-01 06:20", tz="UTC")
+    assert df["date_completed"].notna().all()
@@ -0,0 +1,88 @@
+"""
+GitHubClient against a local stub server that drops connections and stalls,
+the failures that used to hang or abort the repo tools.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+import requests
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+from github_api import GitHubClient  # noqa: E402
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """
+    /drop/N closes the first N connections without answering, /stall/N
+    sleeps past the client's read timeout on the first N requests, then
+    both answer 200.
+    """
+
+    def do_GET(self):
+        _, mode, times = self.path.split("/")
+        with self.server.lock:
+            self.server.seen[self.path] = self.server.seen.get(self.path, 0) + 1
+            failing = self.server.seen[self.path] <= int(times)
+        if failing and mode == "drop":
+            self.close_connection = True
+            self.connection.shutdown(2)
+            return
+        if failing and mode == "stall":
+            time.sleep(1)
+        body = json.dumps({"ok": True}).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+    server.daemon_threads = True
+    server.lock = threading.Lock()
+    server.seen = {}
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def client(max_retries=3):
+    return GitHubClient("token", cache_dir=None, backoff=0.01, max_retries=max_retries, timeout=(1, 0.3))
+
+
+def url(server, path):
+    return f"http://127.0.0.1:{server.server_address[1]}{path}"
+
+
+def test_dropped_connections_are_retried(server):
+    res = client().get(url(server, "/drop/2"))
+
+    assert res.status_code == 200 and res.json() == {"ok": True}
+    assert server.seen["/drop/2"] == 3
+
+
+def test_stalled_response_times_out_and_is_retried(server):
+    start = time.monotonic()
+    res = client().get(url(server, "/stall/1"))
+
+    assert res.status_code == 200
+    assert server.seen["/stall/1"] == 2
+    assert time.monotonic() - start < 1
+
+
+def test_gives_up_after_the_retries(server):
+    with pytest.raises(requests.ConnectionError):
+        client(max_retries=2).get(url(server, "/drop/5"))
+    assert server.seen["/drop/5"] == 3
@@ -0,0 +1,82 @@
+"""
+prepare_images keeps the photos it is given in assets/img/.originals and
+makes the site images from them; nothing it does may lose an original.
+"""
+import os
+import sys
+
+from PIL import Image
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+import class_website  # noqa: E402
+from class_website import MANIFEST_NAME, ORIGINALS_NAME, REPLACED_NAME, file_hash, prepare_images  # noqa: E402
+
+
+def prepare(img_dir, **kwargs):
+    prepare_images(str(img_dir), max_workers=1, widths=[320], **kwargs)
+
+
+def make_photos(img_dir):
+    img_dir.mkdir(parents=True)
+    Image.new("RGB", (2400, 3200), "red").save(img_dir / "alice1.jpg", quality=95)
+    Image.new("RGB", (900, 1200), "green").save(img_dir / "bob1.png")
+    Image.new("RGB", (900, 1200), "blue").save(img_dir / "bob2.jpg")
+
+
+def originals(img_dir):
+    return sorted(im for im in os.listdir(img_dir / ORIGINALS_NAME) if not im.startswith("."))
+
+
+def test_photos_are_moved_to_originals(tmp_path):
+    img_dir = tmp_path / "img"
+    make_photos(img_dir)
+    prepare(img_dir)
+
+    assert originals(img_dir) == ["alice1.jpg", "bob1.png", "bob2.jpg"]
+    assert Image.open(img_dir / ORIGINALS_NAME / "alice1.jpg").size == (2400, 3200)
+    assert Image.open(img_dir / "alice1.jpg").width == 800
+    assert {"alice2.jpg", "alice1-320w.jpg", "alice2-320w.jpg", "bob1.jpg"} <= set(os.listdir(img_dir))
+
+
+def test_lost_manifest_keeps_the_originals(tmp_path):
+    img_dir = tmp_path / "img"
+    make_photos(img_dir)
+    prepare(img_dir)
+    alice = file_hash(str(img_dir / ORIGINALS_NAME / "alice1.jpg"))
+
+    os.remove(img_dir / MANIFEST_NAME)
+    os.remove(img_dir / "alice2.jpg")
+    prepare(img_dir)
+
+    assert originals(img_dir) == ["alice1.jpg", "bob1.png", "bob2.jpg"]
+    assert file_hash(str(img_dir / ORIGINALS_NAME / "alice1.jpg")) == alice
+    # the mirror is made again from alice1.jpg
+    assert Image.open(img_dir / "alice2.jpg").size == Image.open(img_dir / "alice1.jpg").size
+
+
+def test_old_manifest_keeps_the_originals(tmp_path, monkeypatch):
+    img_dir = tmp_path / "img"
+    make_photos(img_dir)
+    prepare(img_dir)
+    alice = file_hash(str(img_dir / ORIGINALS_NAME / "alice1.jpg"))
+
+    monkeypatch.setattr(class_website, "MANIFEST_VERSION", class_website.MANIFEST_VERSION + 1)
+    prepare(img_dir)
+
+    assert originals(img_dir) == ["alice1.jpg", "bob1.png", "bob2.jpg"]
+    assert file_hash(str(img_dir / ORIGINALS_NAME / "alice1.jpg")) == alice
+
+
+def test_new_photo_replaces_an_original_and_keeps_it(tmp_path):
+    img_dir = tmp_path / "img"
+    make_photos(img_dir)
+    prepare(img_dir)
+    alice = file_hash(str(img_dir / ORIGINALS_NAME / "alice1.jpg"))
+
+    Image.new("RGB", (1200, 1600), "purple").save(img_dir / "alice1.jpg")
+    prepare(img_dir)
+
+    assert Image.open(img_dir / ORIGINALS_NAME / "alice1.jpg").size == (1200, 1600)
+    assert file_hash(str(img_dir / ORIGINALS_NAME / REPLACED_NAME / "alice1.1.jpg")) == alice
+    assert Image.open(img_dir / "alice1.jpg").getpixel((0, 0)) != (255, 0, 0)
@@ -0,0 +1,87 @@
+"""
+The GraphQL and REST listings of an org's public repos, replayed from
+recorded responses, must give repoprivatize the same repos.
+"""
+import json
+import os
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "repoprivatizer"))
+from github_api import GITHUB_GET_REPOS_API  # noqa: E402
+from repoprivatize import get_all_public_repos  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES, name)) as f:
+        return json.load(f)
+
+
+class FixtureResponse:
+
+    def __init__(self, body, headers=None, status_code=200):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self._body = body
+        self.text = json.dumps(body)
+
+    def json(self):
+        return self._body
+
+
+class FixtureClient:
+    """
+    Answers the REST org repos listing and the GraphQL repos query from the
+    recorded pages, keeping a log of what was asked.
+    """
+
+    def __init__(self, graphql_fails=False):
+        self.rest = load_fixture("org_repos_rest.json")
+        self.gql = load_fixture("org_repos_graphql.json")
+        self.graphql_fails = graphql_fails
+        self.calls = []
+
+    def get(self, url, params=None):
+        self.calls.append(("rest", url, params))
+        assert url == GITHUB_GET_REPOS_API.format(self.rest["org"])
+        assert params["type"] == "public"
+        page = self.rest["pages"][str(params.get("page", 1))]
+        return FixtureResponse(page["body"], page["headers"])
+
+    def graphql(self, query, variables=None):
+        self.calls.append(("graphql", variables["cursor"]))
+        if self.graphql_fails:
+            raise Exception("ERROR: GraphQL query failed: 502")
+        assert variables["org"] == self.gql["org"] and variables["privacy"] == "PUBLIC"
+        return self.gql["pages"][variables["cursor"] or "null"]["data"]
+
+
+def test_graphql_and_rest_list_the_same_repos():
+    org = load_fixture("org_repos_rest.json")["org"]
+    rest = get_all_public_repos(org, FixtureClient(), backend="rest")
+    graphql = get_all_public_repos(org, FixtureClient(), backend="graphql")
+
+    assert graphql == rest
+    assert len(rest) == 7
+    assert not any("github.io" in name for name in rest)
+
+
+def test_every_page_is_read():
+    org = load_fixture("org_repos_rest.json")["org"]
+    client = FixtureClient()
+    get_all_public_repos(org, client, backend="graphql")
+    get_all_public_repos(org, client, backend="rest")
+
+    assert [call[1] for call in client.calls if call[0] == "graphql"] == [None, "Y3Vyc29yOnYyOpHOAAE"]
+    assert sorted(call[2]["page"] for call in client.calls if call[0] == "rest") == [1, 2]
+
+
+def test_graphql_failure_falls_back_to_rest():
+    org = load_fixture("org_repos_rest.json")["org"]
+    client = FixtureClient(graphql_fails=True)
+
+    assert get_all_public_repos(org, client) == get_all_public_repos(org, FixtureClient(), backend="rest")
+    assert any(call[0] == "rest" for call in client.calls)
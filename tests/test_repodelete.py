@@ -0,0 +1,55 @@
+"""
+repodelete's concurrent deletes against a local stub of the Github API.
+"""
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "repodelete"))
+import github_api  # noqa: E402
+from github_api import GitHubClient  # noqa: E402
+from repodelete import delete_repos_concurrently  # noqa: E402
+
+from stub_github import StubGitHub, serve  # noqa: E402
+
+NO_CONTENT = (204, {}, b"")
+
+
+@pytest.fixture
+def stub(monkeypatch):
+    stub = StubGitHub()
+    with serve(stub) as url:
+        # paths are resolved against GITHUB_API when the request is made
+        monkeypatch.setattr(github_api, "GITHUB_API", url)
+        yield stub
+
+
+def client():
+    return GitHubClient("token", cache_dir=None, backoff=0.01)
+
+
+def test_failed_deletes_are_collected_and_rate_limits_retried(stub):
+    stub.route("DELETE", "/repos/org/a", NO_CONTENT)
+    stub.route("DELETE", "/repos/org/b", (403, {}, json.dumps({"message": "Must have admin rights"}).encode()))
+    stub.route("DELETE", "/repos/org/c", (429, {"Retry-After": "0"}, b""), NO_CONTENT)
+    stub.route("DELETE", "/repos/org/d", (502, {}, b"bad gateway"), NO_CONTENT)
+
+    summary = delete_repos_concurrently(["org/a", "org/b", "org/c", "org/d"], client(), max_workers=4)
+
+    assert sorted(summary["ok"]) == ["org/a", "org/c", "org/d"]
+    assert summary["failed"] == {"org/b": "403: Must have admin rights"}
+    assert stub.count("DELETE", "/repos/org/b") == 1
+    assert stub.count("DELETE", "/repos/org/c") == 2
+    assert stub.count("DELETE", "/repos/org/d") == 2
+
+
+def test_redirect_status_is_a_failure(stub):
+    stub.route("DELETE", "/repos/org/moved", (300, {}, b"not json"))
+
+    summary = delete_repos_concurrently(["org/moved"], client())
+
+    assert summary == {"ok": [], "failed": {"org/moved": "300: not json"}}
@@ -0,0 +1,68 @@
+"""
+clean.py's index then delete against the local fake Slack: what changed on
+Slack after indexing decides what is deleted.
+"""
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "slackcleaner"))
+import clean  # noqa: E402
+import purge  # noqa: E402
+from message_index import MessageIndex  # noqa: E402
+
+from fake_slack import FakeSlack, serve  # noqa: E402
+
+UNLIMITED = {tier: 1e6 for tier in purge.TIER_PER_MINUTE}
+
+
+@pytest.fixture
+def fake():
+    fake = FakeSlack()
+    fake.add_channel("C1", "general")
+    for n in range(1, 11):
+        fake.add_message("C1", f"16000000{n:02d}.000100")
+    return fake
+
+
+@pytest.fixture
+def api(fake):
+    with serve(fake) as url:
+        api = purge.SlackAPI("token", api_url=url, limiter=purge.RateLimiter(per_minute=UNLIMITED))
+        yield api
+        api.close()
+
+
+def delete(api, index, tmp_path, replies=True, **filters):
+    '''
+    What `clean.py delete` does once the query has selected rows.
+    '''
+    rows = index.select(**filters)
+    rows = clean.reselect(api, index, rows, **filters)
+    purger = purge.Purger(api, purge.Checkpoint(str(tmp_path / "checkpoint.json")), workers=4, replies=replies)
+    return clean.delete_rows(purger, index, rows)
+
+
+@pytest.mark.parametrize("replies", [True, False])
+def test_message_pinned_after_indexing_is_kept(fake, api, tmp_path, replies):
+    index = MessageIndex(str(tmp_path / "index.sqlite"))
+    clean.index_channels(api, index, list(api.channels()))
+    fake.pin("C1", "1600000005.000100")
+
+    assert delete(api, index, tmp_path, replies=replies, keep_pinned=True) == {"general": (9, 0)}
+    assert fake.live_messages("C1") == ["1600000005.000100"]
+
+
+def test_thread_started_after_indexing_goes_with_its_replies(fake, api, tmp_path):
+    index = MessageIndex(str(tmp_path / "index.sqlite"))
+    clean.index_channels(api, index, list(api.channels()))
+    fake.add_reply("C1", "1600000003.000100", "1600000099.000200")
+    # an update only fetches messages newer than the newest indexed one
+    clean.index_channels(api, index, list(api.channels()))
+    assert index.select(channels=["general"])[7]["reply_count"] == 0
+
+    assert delete(api, index, tmp_path, channels=["general"]) == {"general": (10, 0)}
+    assert fake.live_messages("C1") == []
+    assert fake.live_replies() == []
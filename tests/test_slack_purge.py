@@ -0,0 +1,101 @@
+"""
+purge.py against the local fake Slack: interrupted purges resume from the
+checkpoint, and rate limits, 5xx responses and dropped connections are
+retried instead of aborting the purge.
+"""
+import json
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, os.path.join(ROOT, "slackcleaner"))
+import purge  # noqa: E402
+
+from fake_slack import FakeSlack, serve  # noqa: E402
+
+UNLIMITED = {tier: 1e6 for tier in purge.TIER_PER_MINUTE}
+MESSAGES = [f"16000000{n:02d}.000100" for n in range(1, 13)]
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    monkeypatch.setattr(purge, "HISTORY_PAGE_SIZE", 5)
+    fake = FakeSlack()
+    fake.add_channel("C1", "general")
+    for ts in MESSAGES:
+        fake.add_message("C1", ts, files=[f"F{ts[8:10]}"] if ts.endswith("4.000100") else ())
+    fake.add_reply("C1", MESSAGES[2], "1600000099.000200")
+    return fake
+
+
+@pytest.fixture
+def api(fake):
+    with serve(fake) as url:
+        api = purge.SlackAPI("token", api_url=url, limiter=purge.RateLimiter(per_minute=UNLIMITED),
+                             max_retries=3, backoff=0.01)
+        yield api
+        api.close()
+
+
+def purger(api, tmp_path, workers=4):
+    return purge.Purger(api, purge.Checkpoint(str(tmp_path / "checkpoint.json")), workers=workers)
+
+
+def test_purge_deletes_messages_replies_and_files(fake, api, tmp_path):
+    summary = purger(api, tmp_path).purge(api.channels())
+
+    assert summary == {"general": {"latest": MESSAGES[0], "deleted": 12, "failed": 0}}
+    assert fake.live_messages("C1") == [] and fake.live_replies() == [] and fake.files == set()
+    # a finished purge leaves nothing to resume
+    assert json.load(open(tmp_path / "checkpoint.json")) == {}
+
+
+def test_interrupted_purge_resumes_from_the_checkpoint(fake, api, tmp_path, monkeypatch):
+    pages = []
+    delete_messages = purge.Purger.delete_messages
+
+    def interrupt_on_second_page(self, channel_id, messages, pool):
+        pages.append([m["ts"] for m in messages])
+        if len(pages) == 2:
+            raise KeyboardInterrupt
+        return delete_messages(self, channel_id, messages, pool)
+
+    monkeypatch.setattr(purge.Purger, "delete_messages", interrupt_on_second_page)
+    with pytest.raises(KeyboardInterrupt):
+        purger(api, tmp_path).purge(api.channels())
+
+    checkpoint = json.load(open(tmp_path / "checkpoint.json"))
+    assert checkpoint == {"C1": {"latest": MESSAGES[7], "deleted": 5, "failed": 0}}
+    assert fake.live_messages("C1") == MESSAGES[:7]
+
+    monkeypatch.setattr(purge.Purger, "delete_messages", delete_messages)
+    history_calls = fake.calls["conversations.history"]
+    summary = purger(api, tmp_path).purge(api.channels())
+
+    assert summary["general"]["deleted"] == 12
+    assert fake.live_messages("C1") == []
+    # picked up below the checkpoint: two pages, not three
+    assert fake.calls["conversations.history"] - history_calls == 2
+
+
+def test_rate_limits_5xx_and_dropped_connections_are_retried(fake, api, tmp_path):
+    fake.fail("conversations.history", 503, "drop")
+    fake.fail("chat.delete", 429, 500, "drop", 429)
+    fake.fail("conversations.replies", 502)
+
+    summary = purger(api, tmp_path).purge(api.channels())
+
+    assert summary["general"] == {"latest": MESSAGES[0], "deleted": 12, "failed": 0}
+    assert fake.live_messages("C1") == [] and fake.live_replies() == []
+    assert fake.calls["chat.delete"] == 13 + 4
+
+
+def test_delete_failing_after_the_retries_is_counted_not_raised(fake, api, tmp_path):
+    fake.fail("chat.delete", *[500] * 4)
+
+    summary = purger(api, tmp_path, workers=1).purge(api.channels())
+
+    assert summary["general"]["deleted"] == 11 and summary["general"]["failed"] == 1
+    assert fake.live_messages("C1") == [MESSAGES[-1]]